@@ -0,0 +1,278 @@
+import heapq
+import math
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class HNSWIndex:
+    """
+    Hierarchical Navigable Small World graph for approximate cosine search.
+
+    The index stores only the graph; vectors are read from the unit-normalized
+    matrix of the owning VectorStorage, so similarity is a plain dot product.
+    Nodes are identified by their storage row.
+
+    Each insert is a pure-Python graph search with `ef_construction`
+    candidates: about 4-5 ms per row at 1536 dimensions with the defaults,
+    ~85 s to index 20k rows. The async builders of the databases run it off
+    the event loop, but budget for it next to the query-time numbers of
+    `evaluation.recall_latency_report()` (see `evaluation.build_seconds()`).
+
+    Args:
+        M: Maximum links per node on the upper layers (layer 0 allows 2 * M)
+        ef_construction: Candidate list size used while inserting
+        ef_search: Candidate list size used while searching (raised to k if smaller)
+        seed: Seed for the random level assignment
+    """
+
+    def __init__(
+        self,
+        M: int = 16,
+        ef_construction: int = 200,
+        ef_search: int = 50,
+        seed: Optional[int] = None,
+    ):
+        if M < 2:
+            raise ValueError("M must be at least 2")
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._level_mult = 1 / math.log(M)
+        self._rng = np.random.default_rng(seed)
+        self._links: List[Dict[int, List[int]]] = []  # level -> row -> neighbours
+        self._levels: Dict[int, int] = {}  # row -> top level of that node
+        self._entry_point: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._levels)
+
+    def reset(self) -> None:
+        """Drop the whole graph, e.g. after the storage rows were renumbered."""
+        self._links = []
+        self._levels = {}
+        self._entry_point = None
+
+    def remap(self, matrix: np.ndarray, mapping: np.ndarray) -> None:
+        """
+        Renumber the graph after a storage vacuum instead of rebuilding it.
+
+        Args:
+            matrix: The re-packed storage matrix
+            mapping: Old row -> new row, -1 for removed rows (VectorStorage.vacuum())
+        """
+        mapping = np.asarray(mapping).tolist()
+
+        def renumber(row: int) -> int:
+            return mapping[row] if row < len(mapping) else -1
+
+        levels = {}
+        for row, level in self._levels.items():
+            if renumber(row) >= 0:
+                levels[renumber(row)] = level
+        links = []
+        for layer, layer_links in enumerate(self._links):
+            remapped = {}
+            for row, neighbours in layer_links.items():
+                new_row = renumber(row)
+                if new_row < 0:
+                    continue
+                kept, bridged = [], []
+                for neighbour in neighbours:
+                    if renumber(neighbour) >= 0:
+                        kept.append(renumber(neighbour))
+                    else:
+                        # Reconnect through the removed node's own neighbours
+                        bridged.extend(layer_links.get(neighbour, []))
+                if bridged:
+                    seen = set(kept)
+                    seen.add(new_row)
+                    for candidate in bridged:
+                        candidate = renumber(candidate)
+                        if candidate >= 0 and candidate not in seen:
+                            seen.add(candidate)
+                            kept.append(candidate)
+                    if len(kept) > self._max_links(layer):
+                        scores = matrix[kept] @ matrix[new_row]
+                        kept = self._select_neighbours(
+                            matrix, list(zip(scores.tolist(), kept)), self._max_links(layer)
+                        )
+                remapped[new_row] = kept
+            links.append(remapped)
+        self._levels, self._links = levels, links
+        while self._links and not self._links[-1]:
+            self._links.pop()
+
+        if self._entry_point is not None and renumber(self._entry_point) >= 0:
+            self._entry_point = renumber(self._entry_point)
+        else:
+            self._entry_point = max(self._levels, key=self._levels.get) if self._levels else None
+
+    def add(self, matrix: np.ndarray, rows: Sequence[int]) -> None:
+        """
+        Link newly written storage rows into the graph.
+
+        Rows that are already present (overwritten keys) are re-linked using
+        their new vector.
+        """
+        for row in rows:
+            self._insert(matrix, int(row))
+
+    def search(
+        self, matrix: np.ndarray, query: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k by dot product against a unit-normalized query.
+
+        Returns:
+            (rows, scores), best match first
+        """
+        if self._entry_point is None or k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+        entry = self._entry_point
+        entry_score = float(matrix[entry] @ query)
+        for level in range(self._levels[entry], 0, -1):
+            entry, entry_score = self._greedy_closest(matrix, query, entry, entry_score, level)
+
+        found = self._search_layer(
+            matrix, query, [(entry_score, entry)], max(self.ef_search, k), 0
+        )
+        found.sort(key=lambda item: (-item[0], item[1]))
+        found = found[:k]
+        return (
+            np.array([row for _, row in found], dtype=np.intp),
+            np.array([score for score, _ in found], dtype=np.float32),
+        )
+
+    def _random_level(self) -> int:
+        return int(-math.log(1.0 - self._rng.random()) * self._level_mult)
+
+    def _max_links(self, level: int) -> int:
+        return 2 * self.M if level == 0 else self.M
+
+    def _insert(self, matrix: np.ndarray, row: int) -> None:
+        query = matrix[row]
+        level = self._levels.get(row)
+        if level is None:
+            level = self._random_level()
+            self._levels[row] = level
+        while len(self._links) <= level:
+            self._links.append({})
+        for layer in range(level + 1):
+            self._links[layer].setdefault(row, [])
+
+        if self._entry_point is None or len(self._levels) == 1:
+            self._entry_point = row
+            return
+
+        entry = self._entry_point
+        entry_score = float(matrix[entry] @ query)
+        top_level = self._levels[entry]
+        for layer in range(top_level, level, -1):
+            entry, entry_score = self._greedy_closest(matrix, query, entry, entry_score, layer)
+
+        candidates = [(entry_score, entry)]
+        for layer in range(min(level, top_level), -1, -1):
+            candidates = self._search_layer(
+                matrix, query, candidates, self.ef_construction, layer
+            )
+            others = [(score, node) for score, node in candidates if node != row]
+            if not others:
+                continue
+            neighbours = self._select_neighbours(matrix, others, self.M)
+            self._links[layer][row] = neighbours
+            for neighbour in neighbours:
+                links = self._links[layer][neighbour]
+                if row in links:
+                    continue
+                links.append(row)
+                if len(links) > self._max_links(layer):
+                    scores = matrix[links] @ matrix[neighbour]
+                    self._links[layer][neighbour] = self._select_neighbours(
+                        matrix, list(zip(scores.tolist(), links)), self._max_links(layer)
+                    )
+
+        if level > top_level:
+            self._entry_point = row
+
+    def _greedy_closest(
+        self, matrix: np.ndarray, query: np.ndarray, entry: int, entry_score: float, level: int
+    ) -> Tuple[int, float]:
+        improved = True
+        while improved:
+            improved = False
+            neighbours = self._links[level].get(entry, [])
+            if not neighbours:
+                break
+            scores = matrix[neighbours] @ query
+            best = int(np.argmax(scores))
+            if scores[best] > entry_score:
+                entry, entry_score = neighbours[best], float(scores[best])
+                improved = True
+        return entry, entry_score
+
+    def _search_layer(
+        self,
+        matrix: np.ndarray,
+        query: np.ndarray,
+        entry_points: List[Tuple[float, int]],
+        ef: int,
+        level: int,
+    ) -> List[Tuple[float, int]]:
+        visited = {node for _, node in entry_points}
+        candidates = [(-score, node) for score, node in entry_points]  # max-heap
+        results = [(score, node) for score, node in entry_points]  # min-heap
+        heapq.heapify(candidates)
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        links = self._links[level]
+        while candidates:
+            negative_score, node = heapq.heappop(candidates)
+            if -negative_score < results[0][0] and len(results) >= ef:
+                break
+            fresh = [n for n in links.get(node, []) if n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            scores = (matrix[fresh] @ query).tolist()
+            for score, neighbour in zip(scores, fresh):
+                if len(results) < ef or score > results[0][0]:
+                    heapq.heappush(candidates, (-score, neighbour))
+                    heapq.heappush(results, (score, neighbour))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return results
+
+    def _select_neighbours(
+        self, matrix: np.ndarray, candidates: List[Tuple[float, int]], limit: int
+    ) -> List[int]:
+        """
+        Neighbour selection heuristic from the HNSW paper: walk candidates from
+        closest to farthest and keep one only if it is closer to the base node
+        than to any neighbour already kept, which preserves links across
+        clusters. Remaining slots are back-filled with the closest discarded
+        candidates.
+        """
+        ordered = sorted(candidates, key=lambda item: (-item[0], item[1]))
+        nodes = [node for _, node in ordered]
+        if len(nodes) <= limit:
+            return nodes
+        vectors = matrix[nodes]
+        pairwise = vectors @ vectors.T
+
+        kept: List[int] = []
+        discarded: List[int] = []
+        for i, (score, _) in enumerate(ordered):
+            if len(kept) >= limit:
+                break
+            if not kept or score > pairwise[i, kept].max():
+                kept.append(i)
+            else:
+                discarded.append(i)
+        for i in discarded:
+            if len(kept) >= limit:
+                break
+            kept.append(i)
+        return [nodes[i] for i in kept]
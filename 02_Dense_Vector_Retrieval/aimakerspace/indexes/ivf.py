@@ -0,0 +1,252 @@
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+from aimakerspace.vector_storage import normalize_rows, top_k
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    n_iter: int = 20,
+    seed: Optional[int] = None,
+) -> np.ndarray:
+    """
+    k-means on unit vectors using cosine similarity.
+
+    Returns:
+        Unit-normalized centroids of shape (n_clusters, dim)
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters with random points so every list stays in use
+            sums[empty] = vectors[rng.choice(vectors.shape[0], int(empty.sum()))]
+        updated, _ = normalize_rows(sums)
+        if np.allclose(updated, centroids, atol=1e-6):
+            centroids = updated
+            break
+        centroids = updated
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index with a k-means coarse quantizer.
+
+    Stored rows are assigned to the nearest of `n_lists` centroids. A query
+    scores the centroids first and then only the rows in the `nprobe` closest
+    posting lists, so the work per query is roughly nprobe / n_lists of a
+    brute-force scan.
+
+    Rows added before the index has enough data to train are kept in a
+    pending list that is scanned exhaustively. The quantizer is retrained
+    automatically once the number of indexed rows has grown by
+    `retrain_growth` since the last training.
+
+    Args:
+        n_lists: Number of centroids; defaults to about sqrt(N) at training time
+        nprobe: Number of posting lists scanned per query
+        n_iter: k-means iterations per training run
+        min_train_size: Rows required before the first training
+        max_train_size: Cap on the sample used for training, bounding its memory
+        retrain_growth: Growth factor in row count that triggers a retrain (None disables)
+        seed: Seed for centroid initialization and sampling
+    """
+
+    def __init__(
+        self,
+        n_lists: Optional[int] = None,
+        nprobe: int = 8,
+        n_iter: int = 20,
+        min_train_size: int = 1024,
+        max_train_size: int = 65536,
+        retrain_growth: Optional[float] = 2.0,
+        seed: Optional[int] = None,
+    ):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.min_train_size = min_train_size
+        self.max_train_size = max_train_size
+        self.retrain_growth = retrain_growth
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._assignments = np.empty(0, dtype=np.int32)  # row -> list, -1 if pending
+        self._lists: List[List[int]] = []
+        self._list_arrays: List[Optional[np.ndarray]] = []
+        self._pending: List[int] = []
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        """Rows covered by the index: assigned to a posting list or pending."""
+        return int(np.count_nonzero(self._assignments >= 0)) + len(self._pending)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def reset(self) -> None:
+        """Forget the centroids and posting lists, e.g. after the storage rows were renumbered."""
+        self.centroids = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._lists = []
+        self._list_arrays = []
+        self._pending = []
+        self._trained_size = 0
+
+    def remap(self, matrix: np.ndarray, mapping: np.ndarray) -> None:
+        """
+        Renumber the posting lists after a storage vacuum, keeping the centroids.
+
+        Args:
+            matrix: The re-packed storage matrix
+            mapping: Old row -> new row, -1 for removed rows (VectorStorage.vacuum())
+        """
+        mapping = np.asarray(mapping, dtype=np.intp)
+        kept = np.flatnonzero(mapping >= 0)
+        assignments = np.full(max(len(kept), 1), -1, dtype=np.int32)
+        inside = kept[kept < self._assignments.shape[0]]
+        assignments[mapping[inside]] = self._assignments[inside]
+        self._assignments = assignments
+        self._pending = [int(mapping[row]) for row in self._pending if row < len(mapping) and mapping[row] >= 0]
+        self._trained_size = min(self._trained_size, len(kept))
+        if self.is_trained:
+            rows = np.flatnonzero(assignments >= 0)
+            order = rows[np.argsort(assignments[rows], kind="stable")]
+            bounds = np.searchsorted(assignments[order], np.arange(self.centroids.shape[0] + 1))
+            self._lists = [order[bounds[i] : bounds[i + 1]].tolist() for i in range(self.centroids.shape[0])]
+            self._list_arrays = [None] * self.centroids.shape[0]
+
+    def train(self, matrix: np.ndarray) -> None:
+        """(Re)train the centroids on `matrix` and reassign every row to a posting list."""
+        rng = np.random.default_rng(self.seed)
+        sample = matrix
+        if matrix.shape[0] > self.max_train_size:
+            sample = matrix[np.sort(rng.choice(matrix.shape[0], self.max_train_size, replace=False))]
+        n_lists = self.n_lists or max(1, int(np.sqrt(matrix.shape[0])))
+        self.centroids = spherical_kmeans(sample, n_lists, self.n_iter, self.seed)
+
+        self._assignments = np.full(matrix.shape[0], -1, dtype=np.int32)
+        self._lists = [[] for _ in range(self.centroids.shape[0])]
+        self._list_arrays = [None] * self.centroids.shape[0]
+        self._pending = []
+        self._assign(matrix, np.arange(matrix.shape[0]))
+        self._trained_size = matrix.shape[0]
+
+    def add(self, matrix: np.ndarray, rows: Sequence[int]) -> None:
+        """Assign newly written storage rows, training or retraining when due."""
+        rows = np.asarray(rows, dtype=np.intp)
+        if not self.is_trained:
+            if matrix.shape[0] >= self.min_train_size:
+                self.train(matrix)
+            else:
+                self._grow(matrix.shape[0])
+                self._pending = sorted(set(self._pending).union(rows.tolist()))
+            return
+        if self.retrain_growth is not None and matrix.shape[0] >= self._trained_size * self.retrain_growth:
+            self.train(matrix)
+            return
+        self._grow(matrix.shape[0])
+        self._assign(matrix, rows)
+
+    def search(
+        self, matrix: np.ndarray, query: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k by dot product against a unit-normalized query.
+
+        Returns:
+            (rows, scores), best match first
+        """
+        candidates = self.candidates(query)
+        if len(candidates) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        scores = matrix[candidates] @ query
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        """Sorted rows in the `nprobe` posting lists closest to `query`, plus pending rows."""
+        parts = [np.asarray(self._pending, dtype=np.intp)]
+        if self.is_trained:
+            probes = top_k(self.centroids @ query, self.nprobe)
+            parts.extend(self._list_array(int(probe)) for probe in probes)
+        return np.sort(np.concatenate(parts))
+
+    def save(self, path: str) -> None:
+        """Persist the centroids, row assignments and settings to a single .npz file."""
+        np.savez(
+            path,
+            centroids=self.centroids if self.is_trained else np.empty((0, 0), dtype=np.float32),
+            assignments=self._assignments,
+            pending=np.asarray(self._pending, dtype=np.int64),
+            settings=np.array(
+                [self.nprobe, self.n_iter, self.min_train_size, self.max_train_size, self._trained_size],
+                dtype=np.int64,
+            ),
+            # None is stored as NaN / -1 (seeds are non-negative)
+            retrain_growth=np.array(np.nan if self.retrain_growth is None else self.retrain_growth),
+            seed=np.array(-1 if self.seed is None else self.seed, dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "IVFIndex":
+        """Restore an index written by `save()`; keyword arguments override saved settings."""
+        with np.load(path) as data:
+            nprobe, n_iter, min_train_size, max_train_size, trained_size = data["settings"].tolist()
+            settings = dict(
+                nprobe=nprobe, n_iter=n_iter, min_train_size=min_train_size, max_train_size=max_train_size
+            )
+            if "retrain_growth" in data.files:
+                retrain_growth, seed = float(data["retrain_growth"]), int(data["seed"])
+                settings["retrain_growth"] = None if np.isnan(retrain_growth) else retrain_growth
+                settings["seed"] = None if seed < 0 else seed
+            settings.update(kwargs)
+            index = cls(**settings)
+            index._assignments = data["assignments"].astype(np.int32)
+            index._pending = data["pending"].tolist()
+            index._trained_size = trained_size
+            if data["centroids"].size:
+                index.centroids = data["centroids"].astype(np.float32)
+                index.n_lists = index.n_lists or index.centroids.shape[0]
+                index._lists = [[] for _ in range(index.centroids.shape[0])]
+                index._list_arrays = [None] * index.centroids.shape[0]
+                for row, list_id in enumerate(index._assignments.tolist()):
+                    if list_id >= 0:
+                        index._lists[list_id].append(row)
+        return index
+
+    def _grow(self, size: int) -> None:
+        if size > self._assignments.shape[0]:
+            grown = np.full(max(size, 2 * self._assignments.shape[0]), -1, dtype=np.int32)
+            grown[: self._assignments.shape[0]] = self._assignments
+            self._assignments = grown
+
+    def _assign(self, matrix: np.ndarray, rows: np.ndarray) -> None:
+        if len(rows) == 0:
+            return
+        new_lists = np.argmax(matrix[rows] @ self.centroids.T, axis=1)
+        for row, list_id in zip(rows.tolist(), new_lists.tolist()):
+            previous = self._assignments[row]
+            if previous == list_id:
+                continue
+            if previous >= 0:
+                self._lists[previous].remove(row)
+                self._list_arrays[previous] = None
+            self._assignments[row] = list_id
+            self._lists[list_id].append(row)
+            self._list_arrays[list_id] = None
+
+    def _list_array(self, list_id: int) -> np.ndarray:
+        array = self._list_arrays[list_id]
+        if array is None:
+            array = np.asarray(self._lists[list_id], dtype=np.intp)
+            self._list_arrays[list_id] = array
+        return array
@@ -0,0 +1,250 @@
+import numpy as np
+from typing import Dict, Optional, Sequence, Tuple
+
+from aimakerspace.vector_storage import top_k
+
+
+def kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    n_iter: int = 20,
+    seed: Optional[int] = None,
+) -> np.ndarray:
+    """Euclidean k-means (Lloyd's algorithm); returns centroids of shape (n_clusters, dim)."""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], n_clusters, replace=False)].copy()
+    vector_norms = np.einsum("ij,ij->i", vectors, vectors)
+    for _ in range(n_iter):
+        assignments = assign_to_centroids(vectors, centroids, vector_norms)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(vectors.shape[0], int(empty.sum()))]
+            counts[empty] = 1
+        updated = sums / counts[:, None]
+        if np.allclose(updated, centroids, atol=1e-6):
+            return updated.astype(np.float32)
+        centroids = updated
+    return centroids.astype(np.float32)
+
+
+def assign_to_centroids(
+    vectors: np.ndarray, centroids: np.ndarray, vector_norms: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Index of the nearest centroid (squared L2) for each vector."""
+    if vector_norms is None:
+        vector_norms = np.einsum("ij,ij->i", vectors, vectors)
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    distances = vector_norms[:, None] - 2 * vectors @ centroids.T + centroid_norms[None, :]
+    return np.argmin(distances, axis=1)
+
+
+class ProductQuantizer:
+    """
+    Splits vectors into `n_subvectors` equal slices and quantizes each slice
+    against its own codebook of 2 ** n_bits centroids, so a vector is stored
+    as `n_subvectors` one-byte codes.
+
+    Args:
+        n_subvectors: Number of slices (= bytes per code); must divide the dimension
+        n_bits: Bits per slice code, at most 8
+        n_iter: k-means iterations per codebook
+        seed: Seed for codebook initialization
+    """
+
+    def __init__(self, n_subvectors: int = 32, n_bits: int = 8, n_iter: int = 20, seed: Optional[int] = None):
+        if not 1 <= n_bits <= 8:
+            raise ValueError("n_bits must be between 1 and 8")
+        self.n_subvectors = n_subvectors
+        self.n_bits = n_bits
+        self.n_iter = n_iter
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None  # (n_subvectors, 2 ** n_bits, sub_dim)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    def train(self, vectors: np.ndarray) -> None:
+        dim = vectors.shape[1]
+        if dim % self.n_subvectors:
+            raise ValueError(f"Dimension {dim} is not divisible by n_subvectors={self.n_subvectors}")
+        sub_dim = dim // self.n_subvectors
+        n_centroids = 2 ** self.n_bits
+        if vectors.shape[0] < n_centroids:
+            raise ValueError(f"Need at least {n_centroids} training vectors, got {vectors.shape[0]}")
+        self.codebooks = np.stack(
+            [
+                kmeans(vectors[:, m * sub_dim : (m + 1) * sub_dim], n_centroids, self.n_iter, self.seed)
+                for m in range(self.n_subvectors)
+            ]
+        )
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Quantize vectors into uint8 codes of shape (len(vectors), n_subvectors)."""
+        sub_dim = self.codebooks.shape[2]
+        codes = np.empty((vectors.shape[0], self.n_subvectors), dtype=np.uint8)
+        for m in range(self.n_subvectors):
+            codes[:, m] = assign_to_centroids(vectors[:, m * sub_dim : (m + 1) * sub_dim], self.codebooks[m])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Approximate reconstruction of the encoded vectors."""
+        return np.concatenate(
+            [self.codebooks[m][codes[:, m]] for m in range(self.n_subvectors)], axis=1
+        )
+
+    def lookup_table(self, query: np.ndarray) -> np.ndarray:
+        """Dot product of each query slice with every centroid of its codebook."""
+        sub_dim = self.codebooks.shape[2]
+        return np.einsum("mkd,md->mk", self.codebooks, query.reshape(self.n_subvectors, sub_dim))
+
+    def asymmetric_scores(self, codes: np.ndarray, table: np.ndarray) -> np.ndarray:
+        """
+        Asymmetric distance computation: the full-precision query is scored
+        against encoded vectors by summing one table lookup per slice.
+        """
+        scores = np.zeros(codes.shape[0], dtype=np.float32)
+        for m in range(self.n_subvectors):
+            scores += table[m][codes[:, m]]
+        return scores
+
+
+class PQIndex:
+    """
+    Product-quantized storage tier for approximate cosine search.
+
+    Every stored row is kept in RAM only as an `n_subvectors`-byte code.
+    Queries are scored against all codes with precomputed lookup tables; when
+    `rerank_k` is set, the best `rerank_k` candidates are re-scored against
+    the full-precision rows of the storage matrix. Pair this with
+    `VectorDatabase(vectors_path=...)` so that matrix lives on disk and only
+    the shortlisted rows are paged in.
+
+    Rows added before the quantizer is trained are scored exactly.
+
+    Args:
+        n_subvectors: Bytes per encoded vector (8-64 is typical); must divide the dimension
+        n_bits: Bits per slice code, at most 8
+        rerank_k: Shortlist size re-scored at full precision (None or 0 disables)
+        min_train_size: Rows required before the quantizer is trained
+        max_train_size: Cap on the sample used for training
+        n_iter: k-means iterations per codebook
+        seed: Seed for training
+    """
+
+    def __init__(
+        self,
+        n_subvectors: int = 32,
+        n_bits: int = 8,
+        rerank_k: Optional[int] = 100,
+        min_train_size: int = 4096,
+        max_train_size: int = 65536,
+        n_iter: int = 20,
+        seed: Optional[int] = None,
+    ):
+        self.quantizer = ProductQuantizer(n_subvectors, n_bits, n_iter, seed)
+        self.rerank_k = rerank_k
+        self.min_train_size = max(min_train_size, 2 ** n_bits)
+        self.max_train_size = max_train_size
+        self.seed = seed
+        self._codes = np.empty((0, n_subvectors), dtype=np.uint8)
+        self._size = 0
+
+    def __len__(self) -> int:
+        """Rows encoded so far (0 until the quantizer is trained)."""
+        return self._size
+
+    def reset(self) -> None:
+        """Forget the codebooks and codes, e.g. after the storage rows were renumbered."""
+        self.quantizer.codebooks = None
+        self._codes = np.empty((0, self.quantizer.n_subvectors), dtype=np.uint8)
+        self._size = 0
+
+    def remap(self, matrix: np.ndarray, mapping: np.ndarray) -> None:
+        """
+        Renumber the codes after a storage vacuum, keeping the trained codebooks.
+
+        Args:
+            matrix: The re-packed storage matrix
+            mapping: Old row -> new row, -1 for removed rows (VectorStorage.vacuum())
+        """
+        mapping = np.asarray(mapping, dtype=np.intp)
+        kept = np.flatnonzero(mapping[: self._size] >= 0)
+        # Rows keep their order, so the encoded prefix stays a prefix
+        self._codes[: len(kept)] = self._codes[kept]
+        self._size = len(kept)
+
+    def add(self, matrix: np.ndarray, rows: Sequence[int]) -> None:
+        """Encode newly written storage rows, training the quantizer once enough rows exist."""
+        if not self.quantizer.is_trained:
+            if matrix.shape[0] >= self.min_train_size:
+                self.train(matrix)
+            return
+        rows = np.asarray(rows, dtype=np.intp)
+        self._grow(matrix.shape[0])
+        self._codes[rows] = self.quantizer.encode(matrix[rows])
+        self._size = max(self._size, matrix.shape[0])
+
+    def train(self, matrix: np.ndarray) -> None:
+        """(Re)train the codebooks on a sample of `matrix` and re-encode every row."""
+        rng = np.random.default_rng(self.seed)
+        sample = matrix
+        if matrix.shape[0] > self.max_train_size:
+            sample = matrix[np.sort(rng.choice(matrix.shape[0], self.max_train_size, replace=False))]
+        self.quantizer.train(np.asarray(sample, dtype=np.float32))
+        self._codes = np.empty((0, self.quantizer.n_subvectors), dtype=np.uint8)
+        self._grow(matrix.shape[0])
+        for start in range(0, matrix.shape[0], 65536):
+            block = np.asarray(matrix[start : start + 65536])
+            self._codes[start : start + block.shape[0]] = self.quantizer.encode(block)
+        self._size = matrix.shape[0]
+
+    def search(
+        self, matrix: np.ndarray, query: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k by dot product against a unit-normalized query.
+
+        Returns:
+            (rows, scores), best match first
+        """
+        if not self.quantizer.is_trained:
+            scores = matrix @ query
+            best = top_k(scores, k)
+            return best, scores[best]
+
+        table = self.quantizer.lookup_table(query)
+        scores = self.quantizer.asymmetric_scores(self._codes[: self._size], table)
+        if matrix.shape[0] > self._size:
+            scores = np.concatenate([scores, matrix[self._size :] @ query])
+        if not self.rerank_k:
+            best = top_k(scores, k)
+            return best, scores[best]
+
+        shortlist = np.sort(top_k(scores, max(k, self.rerank_k)))
+        exact = np.asarray(matrix[shortlist]) @ query
+        best = top_k(exact, k)
+        return shortlist[best], exact[best]
+
+    def memory_report(self, dim: int) -> Dict:
+        """Bytes per vector for the PQ codes versus float64 / float32 storage, and the ratios."""
+        code_bytes = self.quantizer.n_subvectors
+        return {
+            "code_bytes": code_bytes,
+            "float64_bytes": dim * 8,
+            "float32_bytes": dim * 4,
+            "compression_vs_float64": dim * 8 / code_bytes,
+            "compression_vs_float32": dim * 4 / code_bytes,
+            "codes_total_bytes": self._size * code_bytes,
+            "codebook_bytes": 0 if self.quantizer.codebooks is None else self.quantizer.codebooks.nbytes,
+        }
+
+    def _grow(self, size: int) -> None:
+        if size > self._codes.shape[0]:
+            grown = np.empty((max(size, 2 * self._codes.shape[0]), self.quantizer.n_subvectors), dtype=np.uint8)
+            grown[: self._codes.shape[0]] = self._codes
+            self._codes = grown
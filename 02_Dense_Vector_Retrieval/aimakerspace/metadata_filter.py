@@ -0,0 +1,219 @@
+import operator
+from abc import ABC, abstractmethod
+
+import numpy as np
+from typing import Any, Callable, Dict, List, Union
+
+from aimakerspace.metadata_index import MetadataIndex, is_number
+
+_COMPARISONS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+
+class MetadataFilter:
+    """
+    A metadata filter compiled from a dict DSL into NumPy mask operations.
+
+    Top-level keys are field names or the logical operators `$and`, `$or`
+    and `$not`; several keys in one dict must all match. A field maps either
+    to a value (equality) or to a dict of operators, i.e. a dict whose keys
+    all start with "$" (any other dict is compared as a value):
+
+        {"year": {"$gte": 2023}, "source": {"$in": ["letter", "memo"]}}
+        {"$or": [{"topic": "investment"}, {"year": {"$lt": 2000}}]}
+        {"topic": {"$ne": "general"}, "$not": {"source": "draft"}}
+
+    Supported operators: `$eq`, `$ne`, `$in`, `$nin`, `$gt`, `$gte`, `$lt`,
+    `$lte` and `$exists`. As in MongoDB, `$ne` and `$nin` also match
+    documents that lack the field, and equality or membership with None
+    matches documents that lack the field as well as those holding None.
+    Equality and membership compare the field's int32 code column against
+    the codes of the wanted values; numeric ranges compare the field's
+    values gathered as float64 in one pass; ranges over other values (e.g.
+    ISO date strings) select the matching distinct values first and then
+    compare codes the same way.
+
+    Args:
+        spec: The filter dict
+    """
+
+    def __init__(self, spec: Dict):
+        self.spec = spec
+        self._node = _compile(spec)
+
+    def mask(self, index: MetadataIndex, size: int) -> np.ndarray:
+        """Boolean mask over the first `size` rows."""
+        return self._node.mask(index, size)
+
+    def selectivity(self, index: MetadataIndex, total: int) -> float:
+        """
+        Estimated fraction of `total` documents that match, from per-value document counts alone.
+
+        Equality, membership and range terms are exact; `$and` / `$or`
+        combine their children assuming independence.
+        """
+        if total <= 0:
+            return 0.0
+        return min(1.0, max(0.0, self._node.selectivity(index, total)))
+
+    def rows(self, index: MetadataIndex, valid: np.ndarray) -> np.ndarray:
+        """Sorted matching rows among those marked in the `valid` mask."""
+        return np.flatnonzero(self.mask(index, len(valid)) & valid)
+
+    def __repr__(self) -> str:
+        return f"MetadataFilter({self.spec!r})"
+
+
+def compile_filter(spec: Union[Dict, MetadataFilter]) -> MetadataFilter:
+    """Compile a filter dict (already compiled filters are returned unchanged)."""
+    return spec if isinstance(spec, MetadataFilter) else MetadataFilter(spec)
+
+
+class _Node(ABC):
+    @abstractmethod
+    def mask(self, index: MetadataIndex, size: int) -> np.ndarray:
+        """Boolean mask over the first `size` rows."""
+
+    @abstractmethod
+    def selectivity(self, index: MetadataIndex, total: int) -> float:
+        """Estimated number of matching documents divided by `total`."""
+
+
+class _Member(_Node):
+    """Rows whose field equals any of `values`."""
+
+    def __init__(self, field: str, values: List):
+        self.field = field
+        self.values = values
+
+    def matching_values(self, index: MetadataIndex) -> List:
+        return self.values
+
+    def mask(self, index: MetadataIndex, size: int) -> np.ndarray:
+        return index.mask(self.field, self.matching_values(index), size)
+
+    def selectivity(self, index: MetadataIndex, total: int) -> float:
+        return sum(index.count(self.field, value) for value in self.matching_values(index)) / total
+
+
+class _Exists(_Member):
+    def __init__(self, field: str):
+        super().__init__(field, [])
+
+    def matching_values(self, index: MetadataIndex) -> List:
+        return index.values(self.field)
+
+    def mask(self, index: MetadataIndex, size: int) -> np.ndarray:
+        return index.present(self.field, size)
+
+
+class _Compare(_Member):
+    def __init__(self, field: str, compare: Callable, operand: Any):
+        super().__init__(field, [])
+        self.compare = compare
+        self.operand = operand
+
+    def matching_values(self, index: MetadataIndex) -> List:
+        numeric = is_number(self.operand)
+        return [
+            value
+            for value in index.values(self.field)
+            if (is_number(value) if numeric else type(value) is type(self.operand))
+            and self.compare(value, self.operand)
+        ]
+
+    def mask(self, index: MetadataIndex, size: int) -> np.ndarray:
+        if is_number(self.operand):
+            # NaN (missing / non-numeric) compares False, so those rows never match
+            return self.compare(index.numeric(self.field, size), self.operand)
+        return super().mask(index, size)
+
+
+class _And(_Node):
+    def __init__(self, children: List[_Node]):
+        self.children = children
+
+    def mask(self, index: MetadataIndex, size: int) -> np.ndarray:
+        if len(self.children) == 1:
+            return self.children[0].mask(index, size)
+        mask = np.ones(size, dtype=bool)
+        for child in self.children:
+            mask &= child.mask(index, size)
+        return mask
+
+    def selectivity(self, index: MetadataIndex, total: int) -> float:
+        return float(np.prod([child.selectivity(index, total) for child in self.children]))
+
+
+class _Or(_And):
+    def mask(self, index: MetadataIndex, size: int) -> np.ndarray:
+        mask = np.zeros(size, dtype=bool)
+        for child in self.children:
+            mask |= child.mask(index, size)
+        return mask
+
+    def selectivity(self, index: MetadataIndex, total: int) -> float:
+        return 1 - float(np.prod([1 - min(1.0, child.selectivity(index, total)) for child in self.children]))
+
+
+class _Not(_Node):
+    def __init__(self, child: _Node):
+        self.child = child
+
+    def mask(self, index: MetadataIndex, size: int) -> np.ndarray:
+        return ~self.child.mask(index, size)
+
+    def selectivity(self, index: MetadataIndex, total: int) -> float:
+        return 1 - min(1.0, self.child.selectivity(index, total))
+
+
+def _compile(spec: Dict) -> _Node:
+    if not isinstance(spec, dict):
+        raise ValueError(f"A metadata filter must be a dict, got {type(spec).__name__}")
+    nodes = []
+    for key, value in spec.items():
+        if key == "$and":
+            nodes.append(_And([_compile(item) for item in _as_list(key, value)]))
+        elif key == "$or":
+            nodes.append(_Or([_compile(item) for item in _as_list(key, value)]))
+        elif key == "$not":
+            nodes.append(_Not(_compile(value)))
+        elif key.startswith("$"):
+            raise ValueError(f"Unknown logical operator: {key}")
+        elif _is_operators(value):
+            nodes.extend(_compile_field(key, op, operand) for op, operand in value.items())
+        else:
+            nodes.append(_equals(key, [value]))
+    return _And(nodes)
+
+
+def _is_operators(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and all(str(key).startswith("$") for key in value)
+
+
+def _equals(field: str, values: List) -> _Node:
+    """Rows whose field equals any of `values`; None also matches rows without the field."""
+    if any(value is None for value in values):
+        return _Or([_Member(field, values), _Not(_Exists(field))])
+    return _Member(field, values)
+
+
+def _compile_field(field: str, op: str, operand: Any) -> _Node:
+    if op == "$eq":
+        return _equals(field, [operand])
+    if op == "$ne":
+        return _Not(_equals(field, [operand]))
+    if op == "$in":
+        return _equals(field, _as_list(op, operand))
+    if op == "$nin":
+        return _Not(_equals(field, _as_list(op, operand)))
+    if op == "$exists":
+        return _Exists(field) if operand else _Not(_Exists(field))
+    if op in _COMPARISONS:
+        return _Compare(field, _COMPARISONS[op], operand)
+    raise ValueError(f"Unknown operator for field {field!r}: {op}")
+
+
+def _as_list(op: str, operand: Any) -> List:
+    if not isinstance(operand, (list, tuple, set)):
+        raise ValueError(f"{op} expects a list, got {type(operand).__name__}")
+    return list(operand)
@@ -0,0 +1,102 @@
+import json
+import numpy as np
+from typing import TYPE_CHECKING, Any, Dict, Hashable, List, Sequence
+
+if TYPE_CHECKING:
+    from aimakerspace.metadata_store import MetadataStore
+
+
+def index_key(value: Any) -> Hashable:
+    """Hashable stand-in for a metadata value (lists become tuples, dicts canonical JSON)."""
+    if isinstance(value, list):
+        return tuple(index_key(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, sort_keys=True, default=str)
+    return value
+
+
+class MetadataIndex:
+    """
+    Filter lookups over the dictionary-encoded columns of a MetadataStore.
+
+    The index holds no per-row state of its own: every field of the store
+    is already an int32 code column, so the rows holding a value are found
+    by comparing that column against the value's code(s) in one vectorized
+    pass, and document counts per value come from the column's running
+    counts. Writes therefore cost nothing here, and a posting being written
+    during streaming ingest is never re-sorted by a concurrent query.
+
+    Numeric range filters gather each row's value through a per-column
+    float64 lookup table over the distinct values (NaN where a row has no
+    numeric value), which is rebuilt only when new values appear.
+
+    Args:
+        store: The MetadataStore whose columns are queried
+    """
+
+    def __init__(self, store: "MetadataStore"):
+        self.store = store
+
+    @property
+    def fields(self) -> List[str]:
+        return self.store.fields
+
+    def values(self, field: str) -> List[Hashable]:
+        """Distinct values currently held by at least one document."""
+        column = self.store.column(field)
+        if column is None:
+            return []
+        return [value for value, count in zip(column.values, column.counts) if count]
+
+    def count(self, field: str, value: Any) -> int:
+        column = self.store.column(field)
+        if column is None:
+            return 0
+        return sum(column.counts[code] for code in column.codes_of(value))
+
+    def mask(self, field: str, values: Sequence[Any], size: int) -> np.ndarray:
+        """Boolean mask over `size` rows marking those whose `field` equals any of `values`."""
+        column = self.store.column(field)
+        if column is None:
+            return np.zeros(size, dtype=bool)
+        codes = [code for value in values for code in column.codes_of(value)]
+        row_codes = column.row_codes(size)
+        if len(codes) == 1:
+            return row_codes == codes[0]
+        return np.isin(row_codes, codes)
+
+    def bitmap(self, field: str, value: Any, size: int) -> np.ndarray:
+        """Boolean mask over `size` rows marking those whose `field` equals `value`."""
+        return self.mask(field, [value], size)
+
+    def present(self, field: str, size: int) -> np.ndarray:
+        """Boolean mask over `size` rows marking those that hold `field` at all."""
+        column = self.store.column(field)
+        if column is None:
+            return np.zeros(size, dtype=bool)
+        return column.row_codes(size) >= 0
+
+    def rows(self, field: str, value: Any) -> np.ndarray:
+        """Sorted rows whose `field` equals `value`."""
+        return np.flatnonzero(self.bitmap(field, value, len(self.store))).astype(np.int32)
+
+    def numeric(self, field: str, size: int) -> np.ndarray:
+        """Float64 column of `field` over `size` rows, NaN where the value is missing or not a number."""
+        column = self.store.column(field)
+        if column is None:
+            return np.full(size, np.nan)
+        # Missing rows hold code -1, which picks the trailing NaN of the table
+        return column.numeric_table()[column.row_codes(size)]
+
+    def match_rows(self, filter_metadata: Dict) -> np.ndarray:
+        """Sorted rows matching every field == value pair of `filter_metadata`."""
+        size = len(self.store)
+        mask = None
+        for field, value in filter_metadata.items():
+            field_mask = self.bitmap(field, value, size)
+            mask = field_mask if mask is None else mask & field_mask
+        return np.flatnonzero(mask).astype(np.int32)
+
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
@@ -0,0 +1,229 @@
+import numpy as np
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from aimakerspace.metadata_index import index_key, is_number
+
+# Values of different types never share a dictionary entry, so True, 1 and 1.0 round-trip
+_DictKey = Tuple[str, Hashable]
+
+
+class _Column:
+    """
+    One dictionary-encoded metadata field.
+
+    Rows hold int32 codes into `values` (-1 where the field is missing), and
+    the number of rows per code, the distinct-value count and the running
+    sum of numeric values are updated on every set and clear.
+    """
+
+    def __init__(self, size: int = 0):
+        self.codes = np.full(max(size, 1024), -1, dtype=np.int32)
+        self.values: List[Any] = []
+        self.counts: List[int] = []
+        self.present = 0
+        self.distinct = 0
+        self.numeric_sum = 0.0
+        self.types: Dict[str, int] = {}
+        self._code_of: Dict[_DictKey, int] = {}
+        # Codes per index_key across types, so filters match 1 == 1.0 == True as Python does
+        self._codes_by_key: Dict[Hashable, List[int]] = {}
+        self._numeric_table: Optional[np.ndarray] = None
+        self._summary: Optional[Dict] = None
+
+    def get(self, row: int) -> int:
+        return int(self.codes[row]) if row < self.codes.shape[0] else -1
+
+    def row_codes(self, size: int) -> np.ndarray:
+        """Codes of the first `size` rows, -1 past the end of the column."""
+        if self.codes.shape[0] >= size:
+            return self.codes[:size]
+        return np.concatenate([self.codes, np.full(size - self.codes.shape[0], -1, dtype=np.int32)])
+
+    def codes_of(self, value: Any) -> List[int]:
+        return self._codes_by_key.get(index_key(value), [])
+
+    def numeric_table(self) -> np.ndarray:
+        """Float64 value of each code (NaN if not a number), plus a trailing NaN for code -1."""
+        if self._numeric_table is None or self._numeric_table.shape[0] != len(self.values) + 1:
+            self._numeric_table = np.array(
+                [float(value) if is_number(value) else np.nan for value in self.values] + [np.nan]
+            )
+        return self._numeric_table
+
+    def set(self, row: int, value: Any) -> None:
+        self.clear(row)
+        if row >= self.codes.shape[0]:
+            grown = np.full(max(row + 1, 2 * self.codes.shape[0]), -1, dtype=np.int32)
+            grown[: self.codes.shape[0]] = self.codes
+            self.codes = grown
+        code = self.encode(value)
+        self.codes[row] = code
+        self._count(code, 1)
+
+    def encode(self, value: Any) -> int:
+        key = (type(value).__name__, index_key(value))
+        code = self._code_of.get(key)
+        if code is None:
+            code = self._code_of[key] = len(self.values)
+            self._codes_by_key.setdefault(key[1], []).append(code)
+            self.values.append(value)
+            self.counts.append(0)
+        return code
+
+    def clear(self, row: int) -> None:
+        code = self.get(row)
+        if code >= 0:
+            self.codes[row] = -1
+            self._count(code, -1)
+
+    def take(self, rows: np.ndarray) -> Optional["_Column"]:
+        """Column of `rows` renumbered 0..len(rows)-1, without unused values (None if empty)."""
+        codes = np.full(len(rows), -1, dtype=np.int32)
+        inside = rows < self.codes.shape[0]
+        codes[inside] = self.codes[rows[inside]]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.values))
+        used = np.flatnonzero(counts)
+        if len(used) == 0:
+            return None
+        column = _Column(len(rows))
+        remap = np.full(len(self.values) + 1, -1, dtype=np.int32)  # codes of -1 index the last slot
+        for code in used.tolist():
+            remap[code] = column.encode(self.values[code])
+            column._count(remap[code], int(counts[code]))
+        column.codes[: len(rows)] = remap[codes]
+        return column
+
+    def _count(self, code: int, delta: int) -> None:
+        value = self.values[code]
+        before = self.counts[code]
+        self.counts[code] += delta
+        self.present += delta
+        self.distinct += (self.counts[code] > 0) - (before > 0)
+        type_name = type(value).__name__
+        self.types[type_name] = self.types.get(type_name, 0) + delta
+        if not self.types[type_name]:
+            del self.types[type_name]
+        if is_number(value):
+            self.numeric_sum += delta * float(value)
+        self._summary = None
+
+    def summary(self, bins: int) -> Dict:
+        """Counts, distinct values and a histogram; O(distinct values), cached until the column changes."""
+        if self._summary is not None:
+            return self._summary
+        live = [(value, count) for value, count in zip(self.values, self.counts) if count]
+        types = sorted(self.types)
+        summary = {
+            "type": types[0] if len(types) == 1 else "mixed",
+            "count": self.present,
+            "distinct": self.distinct,
+            "values": [value for value, _ in live],
+        }
+        numbers = [(value, count) for value, count in live if is_number(value)]
+        if numbers and len(numbers) == len(live):
+            values = np.array([value for value, _ in numbers], dtype=np.float64)
+            weights = np.array([count for _, count in numbers], dtype=np.float64)
+            counts, edges = np.histogram(values, bins=min(bins, len(numbers)), weights=weights)
+            summary.update(
+                min=min(value for value, _ in numbers),
+                max=max(value for value, _ in numbers),
+                mean=self.numeric_sum / self.present,
+                histogram={"edges": edges.tolist(), "counts": counts.astype(np.int64).tolist()},
+            )
+        else:
+            top = sorted(live, key=lambda item: item[1], reverse=True)[:bins]
+            summary["histogram"] = {"values": [value for value, _ in top], "counts": [count for _, count in top]}
+        self._summary = summary
+        return summary
+
+
+class MetadataStore:
+    """
+    Row-aligned document metadata stored column by column.
+
+    Each field is a dictionary-encoded column of int32 codes, so a document
+    costs 4 bytes per field instead of a Python dict, and per-field
+    statistics (document count, distinct values, value types, numeric sum)
+    are maintained incrementally as rows are set and cleared. Metadata
+    dicts are rebuilt on demand by `get()`, with fields in the order they
+    were first seen by the store.
+
+    The same code columns back metadata filtering (see MetadataIndex), so
+    the store is the only per-document copy of the metadata: about 1.2 MB
+    in total for 50k documents with four fields, against about 14 MB as
+    key -> dict metadata.
+    """
+
+    def __init__(self):
+        self._columns: Dict[str, _Column] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get(self, row: int) -> Dict:
+        metadata = {}
+        for field, column in self._columns.items():
+            code = column.get(row)
+            if code >= 0:
+                metadata[field] = column.values[code]
+        return metadata
+
+    __getitem__ = get
+
+    def set(self, row: int, metadata: Optional[Dict]) -> None:
+        """Replace the metadata of `row` (None or {} clears it)."""
+        metadata = metadata or {}
+        self._size = max(self._size, row + 1)
+        for field, column in self._columns.items():
+            if field not in metadata:
+                column.clear(row)
+        for field, value in metadata.items():
+            column = self._columns.get(field)
+            if column is None:
+                column = self._columns[field] = _Column(self._size)
+            column.set(row, value)
+
+    def clear(self, row: int) -> None:
+        for column in self._columns.values():
+            column.clear(row)
+
+    def column(self, field: str) -> Optional[_Column]:
+        return self._columns.get(field)
+
+    def items(self, rows: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, Dict]]:
+        """(row, metadata) pairs for `rows`, by default every row of the store."""
+        for row in range(self._size) if rows is None else rows:
+            yield row, self.get(row)
+
+    def take(self, rows: Sequence[int]) -> "MetadataStore":
+        """New store holding `rows` renumbered 0..len(rows)-1, e.g. after a vacuum."""
+        rows = np.asarray(rows, dtype=np.int64)
+        store = MetadataStore()
+        store._size = len(rows)
+        for field, column in self._columns.items():
+            taken = column.take(rows)
+            if taken is not None:
+                store._columns[field] = taken
+        return store
+
+    @property
+    def fields(self) -> List[str]:
+        return [field for field, column in self._columns.items() if column.present]
+
+    def statistics(self, bins: int = 10) -> Dict[str, Dict]:
+        """
+        Per-field statistics of the stored documents.
+
+        Each field reports its value "type" ("int", "str", ... or "mixed"),
+        the "count" of documents holding it, the number of "distinct" values
+        and the distinct "values" themselves, plus a "histogram": equal-width
+        bins over min..max (with "min", "max" and "mean") for numeric fields,
+        or the `bins` most frequent values otherwise. Summaries are cached per
+        field until it changes, so repeated calls cost O(fields).
+        """
+        return {field: column.summary(bins) for field, column in self._columns.items() if column.present}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.codes.nbytes for column in self._columns.values())
@@ -0,0 +1,110 @@
+import numpy as np
+from typing import Callable, Dict, Optional, Union
+
+
+def cosine_similarity(vector_a: np.array, vector_b: np.array) -> float:
+    """Computes the cosine similarity between two vectors."""
+    dot_product = np.dot(vector_a, vector_b)
+    norm_a = np.linalg.norm(vector_a)
+    norm_b = np.linalg.norm(vector_b)
+    return dot_product / (norm_a * norm_b)
+
+
+def euclidean_distance(vector_a: np.array, vector_b: np.array) -> float:
+    """Computes the Euclidean distance between two vectors (inverted for ranking)."""
+    distance = np.linalg.norm(vector_a - vector_b)
+    # Return inverse so that smaller distances (more similar) rank higher
+    return 1 / (1 + distance)
+
+
+def manhattan_distance(vector_a: np.array, vector_b: np.array) -> float:
+    """Computes the Manhattan distance between two vectors (inverted for ranking)."""
+    distance = np.sum(np.abs(vector_a - vector_b))
+    return 1 / (1 + distance)
+
+
+def dot_product(vector_a: np.array, vector_b: np.array) -> float:
+    """Computes the (unnormalized) dot product of two vectors."""
+    return np.dot(vector_a, vector_b)
+
+
+# Batched versions score one query against a block of stored rows. Storage keeps
+# unit-normalized rows plus the original norms, so the stored vectors are
+# unit_rows * norms[:, None]; every function returns "higher is more similar".
+
+
+def cosine_scores(query: np.ndarray, unit_rows: np.ndarray, norms: np.ndarray) -> np.ndarray:
+    query_norm = np.linalg.norm(query)
+    return unit_rows @ (query / (query_norm or 1))
+
+
+def euclidean_scores(query: np.ndarray, unit_rows: np.ndarray, norms: np.ndarray) -> np.ndarray:
+    # |q - v|^2 = |q|^2 + |v|^2 - 2 q.v, with q.v = (unit_row . q) * |v|
+    squared = query @ query + norms * norms - 2 * (unit_rows @ query) * norms
+    return 1 / (1 + np.sqrt(np.maximum(squared, 0)))
+
+
+def manhattan_scores(query: np.ndarray, unit_rows: np.ndarray, norms: np.ndarray) -> np.ndarray:
+    distances = np.abs(unit_rows * norms[:, None] - query).sum(axis=1)
+    return 1 / (1 + distances)
+
+
+def dot_scores(query: np.ndarray, unit_rows: np.ndarray, norms: np.ndarray) -> np.ndarray:
+    return (unit_rows @ query) * norms
+
+
+class Metric:
+    """
+    A similarity measure with a per-pair function and an optional batched one.
+
+    Args:
+        name: Registry name, e.g. "euclidean"
+        pairwise: f(vector_a, vector_b) -> float, higher is more similar
+        batched: f(query, unit_rows, norms) -> scores for a block of stored rows,
+            or None to fall back to calling `pairwise` once per row
+    """
+
+    def __init__(self, name: str, pairwise: Callable, batched: Optional[Callable] = None):
+        self.name = name
+        self.pairwise = pairwise
+        self.batched = batched
+
+    def __repr__(self) -> str:
+        return f"Metric({self.name!r})"
+
+
+_METRICS: Dict[str, Metric] = {}
+_BY_PAIRWISE: Dict[Callable, Metric] = {}
+
+
+def register_metric(name: str, pairwise: Callable, batched: Optional[Callable] = None) -> Metric:
+    """Register a metric so searches accept its name or its pairwise function."""
+    metric = Metric(name, pairwise, batched)
+    _METRICS[name] = metric
+    _BY_PAIRWISE[pairwise] = metric
+    return metric
+
+
+def get_metric(distance_measure: Union[str, Callable, Metric]) -> Metric:
+    """
+    Resolve a metric name, registered pairwise function or Metric.
+
+    Unregistered callables are wrapped in a Metric without a batched
+    implementation, so they are still supported through the slow path.
+    """
+    if isinstance(distance_measure, Metric):
+        return distance_measure
+    if isinstance(distance_measure, str):
+        if distance_measure not in _METRICS:
+            raise ValueError(f"Unknown metric {distance_measure!r}; registered: {sorted(_METRICS)}")
+        return _METRICS[distance_measure]
+    metric = _BY_PAIRWISE.get(distance_measure)
+    if metric is None:
+        metric = Metric(getattr(distance_measure, "__name__", "custom"), distance_measure)
+    return metric
+
+
+COSINE = register_metric("cosine", cosine_similarity, cosine_scores)
+EUCLIDEAN = register_metric("euclidean", euclidean_distance, euclidean_scores)
+MANHATTAN = register_metric("manhattan", manhattan_distance, manhattan_scores)
+DOT = register_metric("dot", dot_product, dot_scores)
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a query for cache lookups: NFC, trimmed, whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings with an optional time-to-live.
+
+    Entries are keyed by (embedding model name, normalized query text), so one
+    cache can be shared by several databases. Concurrent `aembed()` calls for
+    the same uncached query share a single embedding request.
+
+    Args:
+        max_size: Maximum number of cached embeddings (0 disables caching)
+        ttl: Seconds an entry stays valid (None keeps entries until evicted)
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def embed(self, embedding_model: Any, text: str) -> np.ndarray:
+        """Embedding of `text`, calling `embedding_model.get_embedding` only on a miss."""
+        key = self._key(embedding_model, text)
+        vector = self._get(key)
+        if vector is None:
+            vector = self._put(key, embedding_model.get_embedding(text))
+        return vector
+
+    async def aembed(self, embedding_model: Any, text: str) -> np.ndarray:
+        """Like `embed()`, but awaits `embedding_model.async_get_embedding` on a miss."""
+        key = self._key(embedding_model, text)
+        vector = self._get(key)
+        if vector is not None:
+            return vector
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            vector = self._put(key, await embedding_model.async_get_embedding(text))
+            future.set_result(vector)
+            return vector
+        except BaseException as error:
+            future.set_exception(error)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def embed_many(self, embedding_model: Any, texts: Sequence[str]) -> np.ndarray:
+        """Embeddings of `texts` as a 2-D array; misses are embedded in one batch call."""
+        keys = [self._key(embedding_model, text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [self._get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Embed each distinct missing query once
+            unique = list(dict.fromkeys(keys[i] for i in missing))
+            first_text = {keys[i]: texts[i] for i in reversed(missing)}
+            embedded = embedding_model.get_embeddings([first_text[key] for key in unique])
+            fresh = {key: self._put(key, vector) for key, vector in zip(unique, embedded)}
+            for i in missing:
+                vectors[i] = fresh[keys[i]]
+        return np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    @staticmethod
+    def _key(embedding_model: Any, text: str) -> Tuple[str, str]:
+        return getattr(embedding_model, "embeddings_model_name", type(embedding_model).__name__), normalize_query(text)
+
+    def _get(self, key: Tuple[str, str]) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[0] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def _put(self, key: Tuple[str, str], embedding: Sequence[float]) -> np.ndarray:
+        vector = np.array(embedding, dtype=np.float32)
+        vector.flags.writeable = False  # shared between callers
+        if self.max_size <= 0:
+            return vector
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return vector
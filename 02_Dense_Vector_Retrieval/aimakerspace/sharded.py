@@ -0,0 +1,195 @@
+import multiprocessing
+import os
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from aimakerspace.vector_storage import VectorStorage, normalize_rows
+
+# Per-worker views of the shared segments, (re)attached lazily by _attach
+_WORKER_STATE = {}
+
+
+def _attach(segment_names: Tuple[str, str], shape: Tuple[int, int]) -> None:
+    # `shape` is the segment capacity; rows past the published count are never read
+    if _WORKER_STATE.get("names") == segment_names:
+        return
+    for segment in _WORKER_STATE.get("segments", ()):
+        segment.close()
+    matrix_segment, valid_segment = (shared_memory.SharedMemory(name=name) for name in segment_names)
+    _WORKER_STATE["names"] = segment_names
+    _WORKER_STATE["segments"] = (matrix_segment, valid_segment)
+    _WORKER_STATE["matrix"] = np.ndarray(shape, dtype=np.float32, buffer=matrix_segment.buf)
+    _WORKER_STATE["valid"] = np.ndarray(shape[0], dtype=bool, buffer=valid_segment.buf)
+
+
+def _search_shard(
+    segment_names: Tuple[str, str],
+    shape: Tuple[int, int],
+    start: int,
+    stop: int,
+    queries: np.ndarray,
+    k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Local top-k of rows [start, stop) for every query, as global row ids."""
+    _attach(segment_names, shape)
+    scores = queries @ _WORKER_STATE["matrix"][start:stop].T
+    scores[:, ~_WORKER_STATE["valid"][start:stop]] = -np.inf
+    k = min(k, stop - start)
+    keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return keep + start, np.take_along_axis(scores, keep, axis=1)
+
+
+class ShardedSearcher:
+    """
+    Exact cosine search spread over worker processes.
+
+    The unit-normalized storage matrix and its validity mask are copied once
+    into `multiprocessing.shared_memory` segments; every worker maps the same
+    pages, so queries never copy the corpus. The rows are split into
+    `n_shards` contiguous ranges, each worker computes a local top-k for its
+    range with a matrix product, and the coordinator merges the shard results.
+
+    The searcher reflects the storage as of construction or the last
+    `refresh()`. Segments are allocated with spare capacity, so refreshing
+    with the rows written since then copies only those rows and their mask
+    entries; new segments are published only when the capacity runs out or
+    the rows were renumbered. Replaced segments stay linked until the
+    searches already running on them have finished.
+
+    Args:
+        storage: The VectorStorage to serve
+        n_workers: Worker processes (defaults to the CPU count)
+        n_shards: Row ranges to split the matrix into (defaults to n_workers)
+    """
+
+    def __init__(self, storage: VectorStorage, n_workers: Optional[int] = None, n_shards: Optional[int] = None):
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.n_shards = n_shards or self.n_workers
+        self._segments: List[shared_memory.SharedMemory] = []
+        self._capacity = (0, 0)
+        self._rows = 0
+        # Searches running per published segment pair, and replaced pairs waiting for them
+        self._in_flight: Dict[Tuple[str, str], int] = {}
+        self._retired: Dict[Tuple[str, str], List[shared_memory.SharedMemory]] = {}
+        self._state_lock = threading.Lock()
+        # Workers must share our tracker; one of their own would unlink the segments when they exit
+        resource_tracker.ensure_running()
+        self._pool = multiprocessing.get_context().Pool(self.n_workers)
+        self.refresh(storage)
+
+    def refresh(self, storage: VectorStorage, rows: Optional[Sequence[int]] = None) -> None:
+        """
+        Publish the current contents of `storage` to the workers.
+
+        Args:
+            storage: The VectorStorage being served
+            rows: Rows written or deleted since the last refresh; None republishes
+                everything, as required after the rows were renumbered by a vacuum
+        """
+        size, dim = len(storage), storage.dim or 0
+        segments, capacity = self._segments, self._capacity
+        if rows is None or size > capacity[0] or dim != capacity[1]:
+            capacity = (max(size, 2 * capacity[0]) if rows is not None else size, dim)
+            segments = self._allocate(storage, capacity)
+        else:
+            rows = np.unique(np.asarray(rows, dtype=np.intp))
+            matrix_segment, valid_segment = self._segments
+            matrix = np.ndarray(self._capacity, dtype=np.float32, buffer=matrix_segment.buf)
+            valid = np.ndarray(self._capacity[0], dtype=bool, buffer=valid_segment.buf)
+            # Appended rows are invisible to running searches until the shards below include them
+            matrix[self._rows : size] = storage.matrix[self._rows :]
+            valid[self._rows : size] = storage.valid[self._rows :]
+            matrix[rows] = storage.matrix[rows]
+            valid[rows] = storage.valid[rows]
+        bounds = np.linspace(0, size, self.n_shards + 1).astype(int)
+        with self._state_lock:
+            if segments is not self._segments:
+                names = tuple(segment.name for segment in self._segments)
+                if self._in_flight.get(names):
+                    self._retired[names] = self._segments
+                else:
+                    for segment in self._segments:
+                        self._unlink(segment)
+            self._segments, self._capacity = segments, capacity
+            self._rows = size
+            self._live_count = storage.live_count
+            self._shards = [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+    def search_many(self, query_matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k cosine matches for each query row.
+
+        Returns:
+            (rows, scores), each of shape (num_queries, min(k, live rows)), best match first
+        """
+        queries, _ = normalize_rows(np.atleast_2d(query_matrix))
+        k = min(k, self._live_count)
+        if k <= 0:
+            empty = np.empty((queries.shape[0], 0))
+            return empty.astype(np.intp), empty.astype(np.float32)
+
+        with self._state_lock:
+            names = tuple(segment.name for segment in self._segments)
+            capacity, shards = self._capacity, self._shards
+            self._in_flight[names] = self._in_flight.get(names, 0) + 1
+        try:
+            results = self._pool.starmap(
+                _search_shard, [(names, capacity, start, stop, queries, k) for start, stop in shards]
+            )
+        finally:
+            with self._state_lock:
+                self._in_flight[names] -= 1
+                if not self._in_flight[names]:
+                    del self._in_flight[names]
+                    for segment in self._retired.pop(names, ()):
+                        self._unlink(segment)
+        rows = np.concatenate([shard_rows for shard_rows, _ in results], axis=1)
+        scores = np.concatenate([shard_scores for _, shard_scores in results], axis=1)
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        rows = np.take_along_axis(rows, keep, axis=1)
+        scores = np.take_along_axis(scores, keep, axis=1)
+        order = np.lexsort((rows, -scores), axis=-1)
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def search(self, query_vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows, scores = self.search_many(np.asarray(query_vector)[None, :], k)
+        return rows[0], scores[0]
+
+    def close(self) -> None:
+        """Stop the workers and release the shared memory."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        with self._state_lock:
+            for segment in self._segments:
+                self._unlink(segment)
+            for segments in self._retired.values():
+                for segment in segments:
+                    self._unlink(segment)
+            self._segments, self._retired = [], {}
+
+    @staticmethod
+    def _allocate(storage: VectorStorage, capacity: Tuple[int, int]) -> List[shared_memory.SharedMemory]:
+        """New matrix and mask segments with room for `capacity` rows, holding a copy of `storage`."""
+        size = len(storage)
+        matrix_segment = shared_memory.SharedMemory(create=True, size=max(1, capacity[0] * capacity[1] * 4))
+        valid_segment = shared_memory.SharedMemory(create=True, size=max(1, capacity[0]))
+        if size:
+            np.ndarray(capacity, dtype=np.float32, buffer=matrix_segment.buf)[:size] = storage.matrix
+            np.ndarray(capacity[0], dtype=bool, buffer=valid_segment.buf)[:size] = storage.valid
+        return [matrix_segment, valid_segment]
+
+    @staticmethod
+    def _unlink(segment: shared_memory.SharedMemory) -> None:
+        segment.close()
+        segment.unlink()
+
+    def __enter__(self) -> "ShardedSearcher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,100 @@
+import asyncio
+import time
+import numpy as np
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+
+# A stream item is either a text or a (text, metadata) pair
+StreamItem = Union[str, Tuple[str, Optional[Dict]]]
+
+
+async def stream_embeddings(
+    embedding_model: Any,
+    items: Any,
+    on_batch: Callable[[List[str], np.ndarray, List[Optional[Dict]]], None],
+    batch_size: int = 256,
+    max_in_flight: int = 4,
+    progress: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
+    """
+    Embed a stream of texts with a bounded number of concurrent requests.
+
+    `items` may be a sync or async iterable of texts or (text, metadata)
+    pairs. It is consumed lazily in batches of `batch_size`, and at most
+    `max_in_flight` batches are being embedded at any time, so memory use
+    depends on the window rather than the corpus. Each batch is handed to
+    `on_batch(texts, vectors, metadata_list)` as soon as its embeddings
+    arrive, which means batches are delivered in completion order.
+    `on_batch` runs in a worker thread, one batch at a time, so index
+    maintenance does not stall the event loop (or the requests in flight).
+
+    Args:
+        embedding_model: Model exposing `async_get_embeddings`
+        items: Iterable or async iterable of texts or (text, metadata) pairs
+        on_batch: Called with every embedded batch
+        batch_size: Texts per embedding request
+        max_in_flight: Maximum concurrent embedding requests
+        progress: Optional callback receiving the running stats after every batch
+
+    Returns:
+        Final stats: documents, batches, elapsed seconds and documents per second
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+    start = time.perf_counter()
+    stats = {"documents": 0, "batches": 0, "elapsed": 0.0, "docs_per_second": 0.0}
+
+    async def embed(batch: List[Tuple[str, Optional[Dict]]]):
+        texts = [text for text, _ in batch]
+        return texts, await embedding_model.async_get_embeddings(texts), [metadata for _, metadata in batch]
+
+    async def deliver(done) -> None:
+        for task in done:
+            in_flight.discard(task)
+            texts, embeddings, metadata_list = task.result()
+            if texts:
+                await asyncio.to_thread(on_batch, texts, np.asarray(embeddings, dtype=np.float32), metadata_list)
+            stats["documents"] += len(texts)
+            stats["batches"] += 1
+            stats["elapsed"] = time.perf_counter() - start
+            stats["docs_per_second"] = stats["documents"] / stats["elapsed"] if stats["elapsed"] else 0.0
+            if progress is not None:
+                progress(dict(stats))
+
+    in_flight = set()
+    try:
+        async for batch in _batches(items, batch_size):
+            if len(in_flight) >= max_in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                await deliver(done)
+            in_flight.add(asyncio.ensure_future(embed(batch)))
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            await deliver(done)
+    finally:
+        # On failure, cancel the remaining requests and collect their outcomes
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+    return stats
+
+
+async def _batches(items: Any, batch_size: int) -> AsyncIterator[List[Tuple[str, Optional[Dict]]]]:
+    batch = []
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            batch.append(_as_pair(item))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    else:
+        for item in items:
+            batch.append(_as_pair(item))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _as_pair(item: StreamItem) -> Tuple[str, Optional[Dict]]:
+    return (item, None) if isinstance(item, str) else (item[0], item[1])
@@ -0,0 +1,119 @@
+import hashlib
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+
+def key_hash(key: str) -> int:
+    """Stable 64-bit hash of a key, used to intern keys without holding the strings."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class TextArena:
+    """
+    Append-only list of strings packed into one UTF-8 byte buffer.
+
+    String `i` occupies buffer[offsets[i]:offsets[i + 1]] and is decoded only
+    when it is read, so a large corpus costs one byte array and one int64
+    offset per entry instead of one Python string object per entry. The
+    stable 64-bit `key_hash` of every string is kept alongside, so a lookup
+    table can be rebuilt without decoding the buffer.
+    """
+
+    def __init__(self):
+        self._buffer = np.empty(0, dtype=np.uint8)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> str:
+        if not -self._size <= index < self._size:
+            raise IndexError("TextArena index out of range")
+        index %= self._size
+        start, stop = self._offsets[index], self._offsets[index + 1]
+        return self._buffer[start:stop].tobytes().decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self._size):
+            yield self[index]
+
+    @property
+    def hashes(self) -> np.ndarray:
+        """`key_hash` of each string, as uint64."""
+        return self._hashes[: self._size]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._offsets[self._size]) + (2 * self._size + 1) * 8
+
+    def append(self, text: str, text_hash: Optional[int] = None) -> int:
+        """Append `text` and return its index."""
+        return int(self.extend([text], None if text_hash is None else [text_hash])[0])
+
+    def extend(self, texts: Sequence[str], text_hashes: Optional[Sequence[int]] = None) -> np.ndarray:
+        """Append a batch of strings; returns their indices."""
+        encoded = [text.encode("utf-8") for text in texts]
+        if text_hashes is None:
+            text_hashes = [key_hash(text) for text in texts]
+        lengths = np.fromiter((len(data) for data in encoded), dtype=np.int64, count=len(encoded))
+        used = int(self._offsets[self._size])
+        count = len(encoded)
+        self._reserve(used + int(lengths.sum()), self._size + count)
+
+        self._buffer[used : used + int(lengths.sum())] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        self._offsets[self._size + 1 : self._size + count + 1] = used + np.cumsum(lengths)
+        self._hashes[self._size : self._size + count] = np.asarray(text_hashes, dtype=np.uint64)
+        indices = np.arange(self._size, self._size + count)
+        self._size += count
+        return indices
+
+    def take(self, indices: Iterable[int]) -> "TextArena":
+        """New arena holding the strings at `indices`, in that order."""
+        indices = np.asarray(indices, dtype=np.intp)
+        arena = TextArena()
+        if len(indices) == 0:
+            return arena
+        starts, stops = self._offsets[indices], self._offsets[indices + 1]
+        lengths = stops - starts
+        # Byte positions of every selected string, gathered in one pass
+        positions = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        positions += np.arange(int(lengths.sum()))
+        arena._buffer = self._buffer[positions]
+        arena._offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        arena._hashes = self._hashes[indices].copy()
+        arena._size = len(indices)
+        return arena
+
+    def tolist(self) -> List[str]:
+        return list(self)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """The populated buffer, offsets and hashes, e.g. for writing to .npy files."""
+        return {
+            "buffer": self._buffer[: self._offsets[self._size]],
+            "offsets": self._offsets[: self._size + 1],
+            "hashes": self.hashes,
+        }
+
+    @classmethod
+    def from_arrays(cls, buffer: np.ndarray, offsets: np.ndarray, hashes: np.ndarray) -> "TextArena":
+        """Wrap arrays produced by `arrays()`; `buffer` may be memory-mapped."""
+        arena = cls()
+        arena._buffer, arena._offsets, arena._hashes = buffer, offsets, hashes
+        arena._size = len(offsets) - 1
+        return arena
+
+    def _reserve(self, n_bytes: int, n_strings: int) -> None:
+        if n_bytes > self._buffer.shape[0]:
+            buffer = np.empty(max(n_bytes, 2 * self._buffer.shape[0], 4096), dtype=np.uint8)
+            buffer[: self._buffer.shape[0]] = self._buffer
+            self._buffer = buffer
+        if n_strings + 1 > self._offsets.shape[0]:
+            offsets = np.zeros(max(n_strings + 1, 2 * self._offsets.shape[0], 1024), dtype=np.int64)
+            offsets[: self._size + 1] = self._offsets[: self._size + 1]
+            self._offsets = offsets
+            hashes = np.empty(offsets.shape[0], dtype=np.uint64)
+            hashes[: self._size] = self._hashes[: self._size]
+            self._hashes = hashes
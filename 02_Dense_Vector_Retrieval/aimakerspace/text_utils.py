@@ -1,78 +1,413 @@
+import hashlib
+import json
+import multiprocessing
 import os
-from typing import List
+import re
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
+import numpy as np
 import pymupdf
 
+from aimakerspace.text_store import key_hash
+from aimakerspace.vector_storage import write_json
+
+try:
+    import tiktoken
+except ImportError:  # optional, only needed by TokenTextSplitter
+    tiktoken = None
+
+
+class IngestManifest:
+    """
+    On-disk record of ingested files: size, mtime, content hash and chunk ids.
+
+    Loaders given a manifest only produce files that are new or whose
+    content changed since they were recorded (size and mtime are compared
+    first, so unchanged files are never read), and list the recorded files
+    that no longer exist in `deleted`. Chunk ids are the 64-bit `key_hash`
+    of the keys the chunks were stored under in the vector database (the
+    chunk texts), so the manifest never holds the texts themselves; ids are
+    reference counted across files, so a chunk shared by two files is only
+    removed when neither holds it anymore.
+
+    Args:
+        path: JSON file holding the manifest; read if it exists
+    """
+
+    VERSION = 2
 
-class PDFFileLoader:
     def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data["files"]
+            if data.get("version", 1) < 2:
+                # Version 1 recorded the chunk texts themselves
+                for entry in self.files.values():
+                    entry["chunk_ids"] = [key_hash(chunk) for chunk in entry["chunk_ids"]]
+        self._refs = Counter(chunk_id for entry in self.files.values() for chunk_id in entry["chunk_ids"])
+        self._pending: Dict[str, Dict] = {}
+
+    def changes(self, paths: Sequence[str]) -> Tuple[List[str], List[str]]:
+        """
+        Split a file listing against the manifest.
+
+        Returns:
+            (paths that are new or modified, recorded paths that no longer exist)
+        """
+        changed = []
+        for path in paths:
+            stat = os.stat(path)
+            state = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            entry = self.files.get(path)
+            if entry is not None and all(entry[key] == value for key, value in state.items()):
+                continue
+            state["hash"] = file_hash(path)
+            if entry is not None and entry["hash"] == state["hash"]:
+                entry.update(state)  # touched, not modified
+                continue
+            self._pending[path] = state
+            changed.append(path)
+        listed = set(paths)
+        deleted = [path for path in self.files if path not in listed and not os.path.exists(path)]
+        return changed, deleted
+
+    def chunk_ids(self, path: str) -> List[int]:
+        return list(self.files.get(path, {}).get("chunk_ids", []))
+
+    def record(self, path: str, chunks: Sequence[str]) -> Tuple[List[str], List[int]]:
+        """
+        Record the chunks a file was split into.
+
+        Returns:
+            (chunks no other file held before, which must be embedded,
+             ids of the previous version's chunks that no file holds anymore, which must be deleted)
+        """
+        old = self.chunk_ids(path)
+        by_id = {}
+        for chunk in chunks:
+            by_id.setdefault(key_hash(chunk), chunk)
+        new = list(by_id)
+        old_set, new_set = set(old), set(new)
+        self._refs.subtract(old)
+        added = [by_id[chunk_id] for chunk_id in new if chunk_id not in old_set and self._refs[chunk_id] <= 0]
+        removed = [chunk_id for chunk_id in old if chunk_id not in new_set and self._refs[chunk_id] <= 0]
+        self._refs.update(new)
+        state = self._pending.pop(path, None)
+        if state is None:
+            stat = os.stat(path)
+            state = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": file_hash(path)}
+        self.files[path] = {**state, "chunk_ids": new}
+        return added, removed
+
+    def forget(self, path: str) -> List[int]:
+        """Drop a file's entry and return its chunk ids that no other file holds."""
+        old = self.chunk_ids(path)
+        self.files.pop(path, None)
+        self._refs.subtract(old)
+        return [chunk_id for chunk_id in old if self._refs[chunk_id] <= 0]
+
+    def save(self) -> None:
+        write_json(self.path, {"version": self.VERSION, "files": self.files})
+
+
+def file_hash(path: str) -> str:
+    """Hex blake2b digest of a file's contents."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "blake2b").hexdigest()
+
+
+class PDFFileLoader:
+    def __init__(self, path: str, manifest: Optional[IngestManifest] = None):
         self.documents = []
         self.path = path
+        # Per-file {"source", "doc_id", "seconds", "pages", "error"} of the last parallel load
+        self.load_report: List[Dict] = []
+        # With a manifest, only new or modified files are loaded and removed ones are listed in `deleted`
+        self.manifest = manifest
+        self.deleted: List[str] = []
+
+    def load(self, n_workers: Optional[int] = None):
+        for text, _ in self.iter_documents(n_workers):
+            self.documents.append(text)
+
+    def load_file(self, n_workers: Optional[int] = None):
+        self.load(n_workers)
+
+    def load_directory(self, n_workers: Optional[int] = None):
+        self.load(n_workers)
+
+    def load_documents(self, n_workers: Optional[int] = None):
+        self.load(n_workers)
+        return self.documents
+
+    def iter_pages(self) -> Iterator[Tuple[str, Dict]]:
+        """
+        Lazily yield one (text, metadata) record per PDF page.
+
+        Metadata holds the file "source", the 1-based "page" number and the
+        "doc_id" (position of the file in the sorted listing), so records can
+        be streamed straight into `VectorDatabaseWithMetadata.abuild_from_stream`
+        with only one page in memory at a time.
+        """
+        for doc_id, path in enumerate(self._paths()):
+            for page, text in enumerate(_iter_page_texts(path), start=1):
+                yield text, {"source": path, "page": page, "doc_id": doc_id}
+
+    def iter_documents(
+        self, n_workers: Optional[int] = None, pages_per_task: Optional[int] = None
+    ) -> Iterator[Tuple[str, Dict]]:
+        """
+        Lazily yield one (text, {"source", "doc_id", "pages"}) record per PDF, pages joined once.
 
-    def load(self):
+        Args:
+            n_workers: Extract text in a pool of this many processes (None reads
+                in this process). Documents are still yielded in file order; a
+                file that fails is skipped and recorded in `load_report`
+                instead of aborting the run.
+            pages_per_task: With a pool, split PDFs into ranges of this many
+                pages so one large file is spread over several workers; the
+                page counts are taken by the workers as well
+        """
+        paths = self._paths()
+        if n_workers is None:
+            for doc_id, path in enumerate(paths):
+                pages = list(_iter_page_texts(path))
+                yield "".join(pages), {"source": path, "doc_id": doc_id, "pages": len(pages)}
+            return
+
+        self.load_report = []
+        with multiprocessing.get_context().Pool(n_workers) as pool:
+            if pages_per_task:
+                # The pool consumes this lazily, so ranges are dispatched as soon as each count arrives
+                tasks = _page_ranges(paths, pool.imap(_page_count, paths), pages_per_task)
+            else:
+                tasks = ((doc_id, path, 0, None) for doc_id, path in enumerate(paths))
+            yield from self._collect(pool.imap(_read_pdf_task, tasks))
+
+    def _collect(self, results: Iterator) -> Iterator[Tuple[str, Dict]]:
+        """Join the page ranges of each file, which arrive consecutively and in order."""
+        pieces, report = [], None
+        for (doc_id, path), (text, pages, seconds, error) in results:
+            if report is None or report["doc_id"] != doc_id:
+                if report is not None:
+                    yield from self._finish(pieces, report)
+                pieces = []
+                report = {"source": path, "doc_id": doc_id, "seconds": 0.0, "pages": 0, "error": None}
+            pieces.append(text)
+            report["seconds"] += seconds
+            report["pages"] += pages
+            report["error"] = report["error"] or error
+        if report is not None:
+            yield from self._finish(pieces, report)
+
+    def _finish(self, pieces: List[Optional[str]], report: Dict) -> Iterator[Tuple[str, Dict]]:
+        self.load_report.append(report)
+        if report["error"] is None:
+            yield "".join(pieces), {key: report[key] for key in ("source", "doc_id", "pages")}
+
+    def _paths(self) -> List[str]:
         if os.path.isdir(self.path):
-            self.load_directory()
+            paths = _find_files(self.path, ".pdf")
         elif os.path.isfile(self.path) and self.path.endswith(".pdf"):
-            self.load_file()
+            paths = [self.path]
         else:
             raise ValueError(
                 "Provided path is neither a valid directory nor a .pdf file."
             )
+        return _apply_manifest(self, paths)
+
+
+def _find_files(directory: str, extension: str) -> List[str]:
+    """Paths of the files under `directory` ending in `extension`, in sorted order."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, file) for file in sorted(files) if file.endswith(extension))
+    return paths
+
+
+def _apply_manifest(loader: Any, paths: List[str]) -> List[str]:
+    if loader.manifest is None:
+        return paths
+    paths, loader.deleted = loader.manifest.changes(paths)
+    return paths
+
+
+def _imap_ordered(worker: Callable, tasks: Sequence, n_workers: int) -> Iterator:
+    """Run `worker` over `tasks` in a process pool, yielding results in task order as they complete."""
+    with multiprocessing.get_context().Pool(n_workers) as pool:
+        yield from pool.imap(worker, tasks)
+
+
+def _page_ranges(
+    paths: Sequence[str], page_counts: Iterator[Optional[int]], pages_per_task: int
+) -> Iterator[Tuple[int, str, int, Optional[int]]]:
+    """(doc_id, path, start, stop) tasks covering every file in ranges of `pages_per_task` pages."""
+    for doc_id, (path, page_count) in enumerate(zip(paths, page_counts)):
+        if not page_count:
+            yield doc_id, path, 0, None  # the reader reports the error
+            continue
+        for start in range(0, page_count, pages_per_task):
+            yield doc_id, path, start, start + pages_per_task
+
+
+def _page_count(path: str) -> Optional[int]:
+    try:
+        with pymupdf.open(path) as doc:
+            return doc.page_count
+    except Exception:
+        return None  # the worker reports the error
 
-    def load_file(self):
-        doc = pymupdf.open(self.path)
-        text = ""
+
+def _read_pdf_pages(task: Tuple[str, int, Optional[int]]) -> Tuple[Optional[str], int, float, Optional[str]]:
+    """Text of pages [start, stop) of a PDF as (text, pages, seconds, error)."""
+    path, start, stop = task
+    began = time.perf_counter()
+    try:
+        with pymupdf.open(path) as doc:
+            stop = doc.page_count if stop is None else min(stop, doc.page_count)
+            text = "".join(doc[number].get_text() for number in range(start, stop))
+        return text, stop - start, time.perf_counter() - began, None
+    except Exception as error:
+        return None, 0, time.perf_counter() - began, f"{type(error).__name__}: {error}"
+
+
+def _read_pdf_task(
+    task: Tuple[int, str, int, Optional[int]]
+) -> Tuple[Tuple[int, str], Tuple[Optional[str], int, float, Optional[str]]]:
+    """`_read_pdf_pages` of a (doc_id, path, start, stop) task, tagged with its (doc_id, path)."""
+    return task[:2], _read_pdf_pages(task[1:])
+
+
+def _read_text_file(task: Tuple[str, str]) -> Tuple[Optional[str], float, Optional[str]]:
+    """Contents of a text file as (text, seconds, error)."""
+    path, encoding = task
+    began = time.perf_counter()
+    try:
+        with open(path, "r", encoding=encoding) as f:
+            text = f.read()
+        return text, time.perf_counter() - began, None
+    except Exception as error:
+        return None, time.perf_counter() - began, f"{type(error).__name__}: {error}"
+
+
+def _iter_page_texts(path: str) -> Iterator[str]:
+    with pymupdf.open(path) as doc:
         for page in doc:
-            text += page.get_text()
-        self.documents.append(text)
-
-    def load_directory(self):
-        for root, _, files in os.walk(self.path):
-            for file in files:
-                if file.endswith(".pdf"):
-                    doc = pymupdf.open(os.path.join(root, file))
-                    text = ""
-                    for page in doc:
-                        text += page.get_text()
-                    self.documents.append(text)
-
-    def load_documents(self):
-        self.load()
-        return self.documents
+            yield page.get_text()
 
 
 class TextFileLoader:
-    def __init__(self, path: str, encoding: str = "utf-8"):
+    def __init__(self, path: str, encoding: str = "utf-8", manifest: Optional[IngestManifest] = None):
         self.documents = []
         self.path = path
         self.encoding = encoding
+        # Per-file {"source", "doc_id", "seconds", "chars", "error"} of the last parallel load
+        self.load_report: List[Dict] = []
+        # With a manifest, only new or modified files are loaded and removed ones are listed in `deleted`
+        self.manifest = manifest
+        self.deleted: List[str] = []
+
+    def load(self, n_workers: Optional[int] = None):
+        for text, _ in self.iter_documents(n_workers):
+            self.documents.append(text)
+
+    def load_file(self, n_workers: Optional[int] = None):
+        self.load(n_workers)
+
+    def load_directory(self, n_workers: Optional[int] = None):
+        self.load(n_workers)
+
+    def load_documents(self, n_workers: Optional[int] = None):
+        self.load(n_workers)
+        return self.documents
 
-    def load(self):
+    def iter_documents(self, n_workers: Optional[int] = None) -> Iterator[Tuple[str, Dict]]:
+        """
+        Lazily yield one (text, {"source", "doc_id"}) record per .txt file, in sorted file order.
+
+        Args:
+            n_workers: Read the files in a pool of this many processes (None reads
+                in this process); files that fail to read or decode are then
+                skipped and recorded in `load_report` instead of aborting the run
+        """
+        paths = self._paths()
+        if n_workers is None:
+            for doc_id, path in enumerate(paths):
+                with open(path, "r", encoding=self.encoding) as f:
+                    yield f.read(), {"source": path, "doc_id": doc_id}
+            return
+
+        self.load_report = []
+        results = _imap_ordered(_read_text_file, [(path, self.encoding) for path in paths], n_workers)
+        for doc_id, (path, (text, seconds, error)) in enumerate(zip(paths, results)):
+            self.load_report.append({
+                "source": path,
+                "doc_id": doc_id,
+                "seconds": seconds,
+                "chars": 0 if text is None else len(text),
+                "error": error,
+            })
+            if error is None:
+                yield text, {"source": path, "doc_id": doc_id}
+
+    def _paths(self) -> List[str]:
         if os.path.isdir(self.path):
-            self.load_directory()
+            paths = _find_files(self.path, ".txt")
         elif os.path.isfile(self.path) and self.path.endswith(".txt"):
-            self.load_file()
+            paths = [self.path]
         else:
             raise ValueError(
                 "Provided path is neither a valid directory nor a .txt file."
             )
+        return _apply_manifest(self, paths)
 
-    def load_file(self):
-        with open(self.path, "r", encoding=self.encoding) as f:
-            self.documents.append(f.read())
-
-    def load_directory(self):
-        for root, _, files in os.walk(self.path):
-            for file in files:
-                if file.endswith(".txt"):
-                    with open(
-                        os.path.join(root, file), "r", encoding=self.encoding
-                    ) as f:
-                        self.documents.append(f.read())
-
-    def load_documents(self):
-        self.load()
-        return self.documents
+
+class ChunkSpans:
+    """
+    Chunks as (doc_id, start, end) character offsets into their documents.
+
+    The three columns are typed arrays (int32 doc ids, int64 offsets), so a
+    corpus of chunks costs 16 bytes each instead of a string copy; text is
+    only sliced out of the documents by `text()` / `texts()` when needed,
+    e.g. for embedding or display. Offsets double as citation anchors.
+    """
+
+    def __init__(
+        self,
+        doc_ids: np.ndarray,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        token_counts: Optional[np.ndarray] = None,
+    ):
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        # Tokens per chunk, when produced by a token-aware splitter
+        self.token_counts = None if token_counts is None else np.asarray(token_counts, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return self.doc_ids.shape[0]
+
+    def __getitem__(self, i: int) -> Tuple[int, int, int]:
+        return int(self.doc_ids[i]), int(self.starts[i]), int(self.ends[i])
+
+    def __iter__(self) -> Iterator[Tuple[int, int, int]]:
+        return zip(self.doc_ids.tolist(), self.starts.tolist(), self.ends.tolist())
+
+    def text(self, documents: Sequence[str], i: int) -> str:
+        doc_id, start, end = self[i]
+        return documents[doc_id][start:end]
+
+    def texts(self, documents: Sequence[str], indices: Optional[Sequence[int]] = None) -> List[str]:
+        """Materialize the text of the chunks at `indices` (all chunks by default)."""
+        spans = iter(self) if indices is None else (self[i] for i in indices)
+        return [documents[doc_id][start:end] for doc_id, start, end in spans]
 
 
 class CharacterTextSplitter:
@@ -94,6 +429,23 @@ class CharacterTextSplitter:
             chunks.append(text[i : i + self.chunk_size])
         return chunks
 
+    def offsets(self, length: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(starts, ends) of the chunks `split()` cuts from a text of `length` characters."""
+        starts = np.arange(0, length, self.chunk_size - self.chunk_overlap, dtype=np.int64)
+        return starts, np.minimum(starts + self.chunk_size, length)
+
+    def split_spans(self, texts: Sequence[str]) -> ChunkSpans:
+        """Span-mode `split_texts()`: the same chunks as offsets into `texts`, without copying any text."""
+        offsets = [self.offsets(len(text)) for text in texts]
+        counts = [len(starts) for starts, _ in offsets]
+        if not offsets:
+            return ChunkSpans(np.empty(0), np.empty(0), np.empty(0))
+        return ChunkSpans(
+            np.repeat(np.arange(len(texts)), counts),
+            np.concatenate([starts for starts, _ in offsets]),
+            np.concatenate([ends for _, ends in offsets]),
+        )
+
     def split_texts(self, texts: List[str]) -> List[str]:
         chunks = []
         for text in texts:
@@ -101,6 +453,190 @@ class CharacterTextSplitter:
         return chunks
 
 
+# Sentence ends (with closing quotes / brackets) followed by whitespace, and
+# the last character before a blank line. Cutting at match ends keeps the
+# whitespace at the start of the next segment, where tiktoken's pre-tokenizer
+# puts it as well, so segment token counts add up to the chunk's count.
+_SEGMENT_BOUNDARY = re.compile(r"[.!?][\"')\]]*(?=\s)|\S(?=[ \t]*\n[ \t]*\n)")
+
+
+class TokenTextSplitter:
+    """
+    Splits text on sentence and paragraph boundaries under a token budget.
+
+    Each document is cut into sentence / paragraph segments, all segments
+    are tokenized in one batched tiktoken call, and segments are packed
+    greedily into chunks of at most `chunk_size` tokens, so the cost is
+    linear in the text and every chunk's token count is known. A segment
+    longer than the budget is cut at token boundaries. Requires the
+    optional `tiktoken` package.
+
+    Args:
+        chunk_size: Maximum tokens per chunk
+        chunk_overlap: Tokens of whole trailing segments repeated at the start
+            of the next chunk
+        encoding_name: tiktoken encoding, e.g. "cl100k_base"
+        model_name: Take the encoding of this model instead, e.g. "text-embedding-3-small"
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 512,
+        chunk_overlap: int = 0,
+        encoding_name: str = "cl100k_base",
+        model_name: Optional[str] = None,
+    ):
+        assert (
+            chunk_size > chunk_overlap
+        ), "Chunk size must be greater than chunk overlap"
+        if tiktoken is None:
+            raise ImportError(
+                "TokenTextSplitter requires tiktoken; install the `tokens` extra or `pip install tiktoken`"
+            )
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.encoding = (
+            tiktoken.encoding_for_model(model_name) if model_name else tiktoken.get_encoding(encoding_name)
+        )
+
+    def split(self, text: str) -> List[str]:
+        return self.split_spans([text]).texts([text])
+
+    def split_texts(self, texts: List[str]) -> List[str]:
+        return self.split_spans(texts).texts(texts)
+
+    def split_spans(self, texts: Sequence[str]) -> ChunkSpans:
+        """Chunks of all `texts` as (doc_id, start, end) spans with their token counts."""
+        bounds = [_segment_bounds(text) for text in texts]
+        segments = [text[start:end] for text, cuts in zip(texts, bounds) for start, end in zip(cuts, cuts[1:])]
+        tokens = self.encoding.encode_ordinary_batch(segments)
+
+        doc_ids, starts, ends, counts = [], [], [], []
+        position = 0
+        for doc_id, cuts in enumerate(bounds):
+            n_segments = len(cuts) - 1
+            for start, end, count in self._pack(texts[doc_id], cuts, tokens[position : position + n_segments]):
+                doc_ids.append(doc_id)
+                starts.append(start)
+                ends.append(end)
+                counts.append(count)
+            position += n_segments
+        return ChunkSpans(doc_ids, starts, ends, counts)
+
+    def _pack(self, text: str, cuts: List[int], tokens: List[List[int]]) -> List[Tuple[int, int, int]]:
+        chunks = []
+        window: List[Tuple[int, int, int]] = []  # (start, end, tokens) of the open chunk's segments
+        total = 0
+        fresh = False  # the window holds segments not emitted yet
+        for start, end, segment_tokens in zip(cuts, cuts[1:], tokens):
+            count = len(segment_tokens)
+            if count > self.chunk_size:
+                if fresh:
+                    chunks.append((window[0][0], window[-1][1], total))
+                window, total, fresh = [], 0, False
+                chunks.extend(self._cut(text, start, end, segment_tokens))
+                continue
+            if total + count > self.chunk_size and fresh:
+                chunks.append((window[0][0], window[-1][1], total))
+                fresh = False
+            # Keep at most chunk_overlap tokens of trailing segments, and room for this one
+            while window and (not fresh and total > self.chunk_overlap or total + count > self.chunk_size):
+                total -= window.pop(0)[2]
+            window.append((start, end, count))
+            total += count
+            fresh = True
+        if fresh:
+            chunks.append((window[0][0], window[-1][1], total))
+        return chunks
+
+    def _cut(self, text: str, start: int, end: int, tokens: List[int]) -> List[Tuple[int, int, int]]:
+        """Cut one oversized segment into pieces of at most chunk_size tokens."""
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        pieces = []
+        first = 0
+        while first < len(tokens):
+            last = first + self.chunk_size
+            # Tokens holding part of a multi-byte character share its offset; keep them together
+            while first + 1 < last < len(tokens) and offsets[last] == offsets[last - 1]:
+                last -= 1
+            piece_start = start + offsets[first]
+            piece_end = start + offsets[last] if last < len(tokens) else end
+            # Re-encode the piece: BPE merges can differ at the cut
+            pieces.append((piece_start, piece_end, len(self.encoding.encode_ordinary(text[piece_start:piece_end]))))
+            first = last
+        return pieces
+
+
+def _segment_bounds(text: str) -> List[int]:
+    """Offsets [0, ..., len(text)] delimiting the sentence / paragraph segments of `text`."""
+    cuts = [0]
+    for match in _SEGMENT_BOUNDARY.finditer(text):
+        if match.end() > cuts[-1]:
+            cuts.append(match.end())
+    if len(text) > cuts[-1]:
+        cuts.append(len(text))
+    return cuts
+
+
+async def aingest(
+    loader: Any,
+    splitter: Any,
+    vector_db: Any,
+    n_workers: Optional[int] = None,
+    batch_size: int = 256,
+    max_in_flight: int = 4,
+) -> Dict:
+    """
+    Incrementally ingest the files of a loader that has an IngestManifest.
+
+    Only new or modified files are read and split; of their chunks, only
+    those not already stored are embedded (tagged with their "source"), and
+    chunks that disappeared from a modified or deleted file are deleted from
+    `vector_db`, looked up by the key hash the manifest records. The
+    manifest is saved at the end of the run.
+
+    Args:
+        loader: PDFFileLoader or TextFileLoader constructed with a manifest
+        splitter: Object with `split(text) -> List[str]`, e.g. CharacterTextSplitter
+        vector_db: VectorDatabase or VectorDatabaseWithMetadata
+        n_workers: Load files in a process pool of this size (see the loaders)
+        batch_size, max_in_flight: Embedding batching (see `abuild_from_stream`)
+
+    Returns:
+        Counts of "files" processed, "deleted_files", "chunks_added" and "chunks_removed"
+    """
+    manifest = loader.manifest
+    if manifest is None:
+        raise ValueError("aingest() needs a loader constructed with an IngestManifest")
+    stats = {"files": 0, "deleted_files": 0, "chunks_added": 0, "chunks_removed": 0}
+    for text, metadata in loader.iter_documents(n_workers):
+        source = metadata["source"]
+        added, removed = manifest.record(source, splitter.split(text))
+        _delete_chunks(vector_db, removed)
+        if added:
+            await vector_db.abuild_from_stream(
+                ((chunk, {"source": source}) for chunk in added), batch_size, max_in_flight
+            )
+        stats["files"] += 1
+        stats["chunks_added"] += len(added)
+        stats["chunks_removed"] += len(removed)
+    for source in loader.deleted:
+        removed = manifest.forget(source)
+        _delete_chunks(vector_db, removed)
+        stats["deleted_files"] += 1
+        stats["chunks_removed"] += len(removed)
+    manifest.save()
+    return stats
+
+
+def _delete_chunks(vector_db: Any, chunk_ids: Sequence[int]) -> None:
+    for chunk_id in chunk_ids:
+        key = vector_db.storage.key_of_hash(chunk_id)
+        if key is not None:
+            vector_db.delete(key)
+
+
 if __name__ == "__main__":
     loader = TextFileLoader("data/KingLear.txt")
     loader.load()
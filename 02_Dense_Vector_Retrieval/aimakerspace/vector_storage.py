@@ -0,0 +1,790 @@
+import json
+import os
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from aimakerspace.metrics import Metric
+from aimakerspace.text_store import TextArena, key_hash
+
+STORAGE_FORMAT_VERSION = 2
+_KEY_FILES = {"buffer": "keys.npy", "offsets": "keys_offsets.npy", "hashes": "keys_hashes.npy"}
+
+
+def normalize_rows(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Scales each row to unit length, returning the scaled rows and their original norms."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1).astype(np.float32)
+    safe_norms = np.where(norms == 0, 1, norms)
+    return matrix / safe_norms[..., None], norms
+
+
+def write_npy(path: str, array: np.ndarray, fsync: bool = False) -> None:
+    """
+    Atomically write `array` as a .npy file (readers never see a partial file).
+
+    With `fsync=True` the file and its directory entry are flushed to disk
+    before returning, so the write survives a power loss.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if fsync:
+        fsync_directory(os.path.dirname(path))
+
+
+def write_json(path: str, payload: Any, fsync: bool = False) -> None:
+    """Atomically write `payload` as compact JSON (durably with `fsync=True`, as for write_npy)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, separators=(",", ":"))
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if fsync:
+        fsync_directory(os.path.dirname(path))
+
+
+def fsync_directory(path: str) -> None:
+    """Flush the entries of directory `path` (created, renamed or removed files) to disk."""
+    if os.name == "nt":
+        return  # directories cannot be opened for fsync on Windows
+    fd = os.open(path or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the indices of the k highest scores, best first.
+
+    Uses argpartition so only the selected candidates are sorted; equal scores
+    keep their original index order, matching a stable descending sort.
+    """
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float = 0.5) -> np.ndarray:
+    """
+    Maximal marginal relevance: pick k of the candidates, trading relevance to
+    the query against similarity to the candidates already picked.
+
+    The candidate-candidate cosine matrix is computed once; each greedy step
+    is then a vectorized update of every candidate's maximum similarity to
+    the selection, so the cost is one (n, n) product plus k passes over n.
+
+    Args:
+        relevance: Score of each candidate against the query (higher is better)
+        vectors: Unit-normalized candidate vectors, one row per candidate
+        k: Number of candidates to select
+        lambda_mult: 1.0 ranks purely by relevance, 0.0 purely by diversity
+
+    Returns:
+        Indices into the candidates, in selection order
+    """
+    n = relevance.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected = np.empty(k, dtype=np.intp)
+    for step in range(k):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        choice = int(np.argmax(scores))
+        selected[step] = choice
+        available[choice] = False
+        redundancy = similarity[choice] if step == 0 else np.maximum(redundancy, similarity[choice])
+    return selected
+
+
+def minmax_scale(scores: np.ndarray) -> np.ndarray:
+    """
+    Rescale candidate scores to [0, 1] (all ones if they are equal).
+
+    MMR weighs relevance against cosine redundancy, so scores on another
+    scale, such as 1 / (1 + distance), are brought to a comparable range first.
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    if scores.size == 0:
+        return scores
+    low, high = scores.min(), scores.max()
+    if high <= low:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+
+def remap_index(index: Any, matrix: np.ndarray, mapping: np.ndarray) -> None:
+    """
+    Carry an approximate index over `VectorStorage.vacuum()`.
+
+    Indexes with a `remap(matrix, mapping)` method renumber their nodes,
+    posting lists or codes in place; any other index is reset and rebuilt
+    from every row of the re-packed `matrix`.
+    """
+    if hasattr(index, "remap"):
+        index.remap(matrix, mapping)
+        return
+    index.reset()
+    if matrix.shape[0]:
+        index.add(matrix, np.arange(matrix.shape[0]))
+
+
+def sync_index(index: Any, matrix: np.ndarray) -> None:
+    """
+    Add the rows of a freshly loaded `matrix` that `index` does not cover yet.
+
+    An index restored next to the storage (e.g. `IVFIndex.load()`) already
+    covers the leading `len(index)` rows and is left as it is; a new index
+    is built over every row.
+    """
+    covered = len(index) if hasattr(index, "__len__") else 0
+    if covered < matrix.shape[0]:
+        index.add(matrix, np.arange(covered, matrix.shape[0]))
+
+
+class ScalarQuantizedTier:
+    """
+    Reduced-precision copy of the storage matrix used for a fast first pass.
+
+    float16 halves the scan tier. int8 quarters it using a per-dimension
+    offset and scale, with codes in [-127, 127]. The per-dimension range
+    grows with the data; when a batch falls outside it, the whole tier is
+    re-encoded from the full-precision rows.
+
+    Args:
+        dtype: "float16" or "int8"
+        block_size: Rows widened to float32 at a time while scoring
+    """
+
+    def __init__(self, dtype: str = "int8", block_size: int = 16384):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported scan dtype: {dtype}")
+        self.dtype = dtype
+        self.block_size = block_size
+        self.codes = np.empty((0, 0), dtype=np.float16 if dtype == "float16" else np.int8)
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self.low: Optional[np.ndarray] = None
+        self.high: Optional[np.ndarray] = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    def update(self, matrix: np.ndarray, rows: np.ndarray) -> None:
+        """Encode `rows` of the full-precision `matrix` into the tier."""
+        if matrix.shape[0] > self.codes.shape[0]:
+            grown = np.empty((max(matrix.shape[0], 2 * self.codes.shape[0]), matrix.shape[1]), dtype=self.codes.dtype)
+            if self.codes.size:
+                grown[: self.codes.shape[0]] = self.codes
+            self.codes = grown
+        if self.dtype == "float16":
+            self.codes[rows] = matrix[rows].astype(np.float16)
+            return
+
+        batch = np.asarray(matrix[rows])
+        low, high = batch.min(axis=0), batch.max(axis=0)
+        if self.low is None or (low < self.low).any() or (high > self.high).any():
+            low = low if self.low is None else np.minimum(low, self.low)
+            high = high if self.high is None else np.maximum(high, self.high)
+            # Widen by a margin so that slowly drifting data rarely forces a re-encode
+            margin = 0.1 * (high - low)
+            self.set_range(low - margin, high + margin)
+            # Re-encode block by block so a disk-backed matrix is never read into memory at once
+            for start in range(0, matrix.shape[0], self.block_size):
+                stop = min(start + self.block_size, matrix.shape[0])
+                self.codes[start:stop] = self._encode(np.asarray(matrix[start:stop]))
+            return
+        self.codes[rows] = self._encode(batch)
+
+    def _encode(self, block: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint((block - self.offset) / self.scale), -127, 127).astype(np.int8)
+
+    def set_range(self, low: np.ndarray, high: np.ndarray) -> None:
+        """Set the per-dimension int8 range [low, high] and derive offset and scale."""
+        self.low, self.high = low, high
+        self.offset = ((high + low) / 2).astype(np.float32)
+        self.scale = np.maximum((high - low) / 254, 1e-12).astype(np.float32)
+
+    def scores(self, query: np.ndarray, size: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate dot products of `query` with the first `size` rows (or just `rows`)."""
+        if self.dtype == "int8":
+            weights, bias = query * self.scale, float(query @ self.offset)
+        else:
+            weights, bias = query, 0.0
+        count = size if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, self.block_size):
+            stop = min(start + self.block_size, count)
+            block = self.codes[start:stop] if rows is None else self.codes[rows[start:stop]]
+            scores[start:stop] = block.astype(np.float32) @ weights + bias
+        return scores
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Number of set bits in each element of an unsigned integer array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    # NumPy < 2.0: count bytes through a lookup table
+    counts = _BYTE_POPCOUNT[words.view(np.uint8)].reshape(*words.shape, words.itemsize)
+    return counts.sum(axis=-1, dtype=np.uint8)
+
+
+_BYTE_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+class BinaryTier:
+    """
+    Sign-bit copy of the storage matrix used for a Hamming-distance first pass.
+
+    Each dimension is stored as one bit (set when the component is positive),
+    packed into uint64 words: 1536 float32 dimensions become 24 words, a 32x
+    reduction. The Hamming distance between sign codes is computed with XOR
+    and popcount and mapped to an approximate cosine, 1 - 2 * hamming / dim,
+    which is only good for ranking a shortlist, so pair it with a larger
+    re-rank factor than the scalar tiers.
+
+    Args:
+        block_size: Rows scored per block
+    """
+
+    dtype = "binary"
+    offset = None  # no per-dimension range to persist
+
+    def __init__(self, block_size: int = 65536):
+        self.block_size = block_size
+        self.dim = 0
+        self.codes = np.empty((0, 0), dtype=np.uint64)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Pack the sign bits of each row into uint64 words."""
+        vectors = np.atleast_2d(vectors)
+        bits = np.packbits(vectors > 0, axis=1, bitorder="little")
+        padding = -bits.shape[1] % 8
+        if padding:
+            bits = np.pad(bits, ((0, 0), (0, padding)))
+        return np.ascontiguousarray(bits).view(np.uint64)
+
+    def update(self, matrix: np.ndarray, rows: np.ndarray) -> None:
+        """Encode `rows` of the full-precision `matrix` into the tier."""
+        self.dim = matrix.shape[1]
+        words = (self.dim + 63) // 64
+        if matrix.shape[0] > self.codes.shape[0]:
+            grown = np.empty((max(matrix.shape[0], 2 * self.codes.shape[0]), words), dtype=np.uint64)
+            if self.codes.size:
+                grown[: self.codes.shape[0]] = self.codes
+            self.codes = grown
+        self.codes[rows] = self.encode(np.asarray(matrix[rows]))
+
+    def scores(self, query: np.ndarray, size: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate cosine of `query` with the first `size` rows (or just `rows`)."""
+        dim = self.dim or query.shape[0]
+        query_code = self.encode(query[None, :])[0]
+        count = size if rows is None else len(rows)
+        distances = np.empty(count, dtype=np.int32)
+        for start in range(0, count, self.block_size):
+            stop = min(start + self.block_size, count)
+            block = self.codes[start:stop] if rows is None else self.codes[rows[start:stop]]
+            distances[start:stop] = popcount(block ^ query_code).sum(axis=1, dtype=np.int32)
+        return (1 - 2 * distances / dim).astype(np.float32)
+
+
+class VectorStorage:
+    """
+    Contiguous embedding storage backing the vector databases.
+
+    All embeddings live in one float32 matrix whose rows are normalized at
+    insert time, alongside the original row norms. Cosine similarity against
+    every stored vector is then a single matrix-vector product.
+
+    A row number doubles as the dense document id of its key. Keys are packed
+    into a `TextArena` and interned by a 64-bit hash, so looking a key up
+    never requires holding the key strings in a dict, and search results can
+    be passed around as integer arrays and resolved to text only when needed.
+
+    Features:
+    - Amortized O(1) appends (capacity doubles when the matrix fills up)
+    - Re-inserting an existing key overwrites its row in place
+    - Removing a key only tombstones its row; searches skip tombstoned rows
+      and `vacuum()` re-packs the matrix once enough rows are dead
+    - Original vectors can be reconstructed from the unit rows and norms
+    - Optional disk backing: with `path` set, the matrix is a memory-mapped
+      raw float32 file (overwritten on creation), so only the pages actually
+      touched by a search are resident in RAM
+    - Optional float16 / int8 / binary scan tier: `cosine_top_k` scans the
+      quantized copy first and re-scores a shortlist against the float32 rows.
+      Combined with `path`, only the quantized tier has to stay in memory
+
+    Args:
+        dim: Embedding dimension; inferred from the first insert when omitted
+        initial_capacity: Number of rows allocated on the first insert
+        path: Optional file that backs the matrix instead of process memory
+        dtype: Scan precision, one of "float32", "float16", "int8" or "binary"
+            (one sign bit per dimension, scanned by Hamming distance)
+        rerank_factor: With a quantized dtype, k * rerank_factor candidates are
+            re-scored at full precision (default 4, or 16 for the coarser binary scan)
+    """
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        initial_capacity: int = 1024,
+        path: Optional[str] = None,
+        dtype: str = "float32",
+        rerank_factor: Optional[int] = None,
+    ):
+        self.dim = dim
+        self.path = path
+        self.dtype = dtype
+        self.rerank_factor = rerank_factor or (16 if dtype == "binary" else 4)
+        if dtype == "float32":
+            self._scan = None
+        elif dtype == "binary":
+            self._scan = BinaryTier()
+        else:
+            self._scan = ScalarQuantizedTier(dtype)
+        if path is not None:
+            open(path, "wb").close()
+        self.keys = TextArena()
+        self._rows: Dict[int, int] = {}  # key_hash -> row
+        self._colliding_rows: Dict[str, int] = {}  # keys whose hash is taken by another key
+        self._initial_capacity = max(1, initial_capacity)
+        self._matrix = np.empty((0, dim or 0), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._valid = np.empty(0, dtype=bool)
+        self._dead = 0
+
+    def __len__(self) -> int:
+        """Number of rows, including tombstoned ones."""
+        return len(self.keys)
+
+    @property
+    def live_count(self) -> int:
+        return len(self.keys) - self._dead
+
+    @property
+    def live_keys(self) -> List[str]:
+        return [self.keys[row] for row in self.live_rows()]
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Boolean mask of the rows that are not tombstoned."""
+        return self._valid[: len(self.keys)]
+
+    @property
+    def dead_fraction(self) -> float:
+        return self._dead / len(self.keys) if len(self.keys) else 0.0
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.valid)
+
+    def __contains__(self, key: str) -> bool:
+        return self.row_of(key) is not None
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """View of the populated, unit-normalized rows."""
+        return self._matrix[: len(self.keys)]
+
+    @property
+    def norms(self) -> np.ndarray:
+        """View of the original norm of each populated row."""
+        return self._norms[: len(self.keys)]
+
+    def row_of(self, key: str, hashed: Optional[int] = None) -> Optional[int]:
+        """Row (document id) of a live key, or None."""
+        row = self._rows.get(key_hash(key) if hashed is None else hashed)
+        if row is not None and row < len(self.keys) and self.keys[row] == key:
+            return row
+        return self._colliding_rows.get(key)
+
+    def key_of_hash(self, hashed: int) -> Optional[str]:
+        """Live key whose `key_hash` is `hashed`, or None (the first key stored wins a collision)."""
+        row = self._rows.get(hashed)
+        return None if row is None else self.keys[row]
+
+    def add(self, key: str, vector: np.ndarray) -> int:
+        """Insert or overwrite a single vector and return its row."""
+        return int(self.add_batch([key], np.asarray(vector)[None, :])[0])
+
+    def add_batch(self, keys: Sequence[str], vectors: np.ndarray) -> np.ndarray:
+        """
+        Insert or overwrite a batch of vectors.
+
+        Args:
+            keys: One key per row of `vectors`
+            vectors: 2-D array of shape (len(keys), dim)
+
+        Returns:
+            The row index assigned to each key
+        """
+        vectors = np.asarray(vectors)
+        if vectors.ndim != 2 or vectors.shape[0] != len(keys):
+            raise ValueError("vectors must be a 2-D array with one row per key")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}"
+            )
+
+        normalized, norms = normalize_rows(vectors)
+        rows = np.empty(len(keys), dtype=np.intp)
+        new_keys: Dict[str, int] = {}
+        new_hashes: List[int] = []
+        for i, key in enumerate(keys):
+            hashed = key_hash(key)
+            row = new_keys.get(key)
+            if row is None:
+                row = self.row_of(key, hashed)
+            if row is None:
+                row = len(self.keys) + len(new_keys)
+                if hashed in self._rows:
+                    self._colliding_rows[key] = row
+                else:
+                    self._rows[hashed] = row
+                new_keys[key] = row
+                new_hashes.append(hashed)
+            rows[i] = row
+        if new_keys:
+            self._reserve(len(self.keys) + len(new_keys))
+            self.keys.extend(list(new_keys), new_hashes)
+        self._matrix[rows] = normalized
+        self._norms[rows] = norms
+        self._valid[rows] = True
+        if self._scan is not None:
+            self._scan.update(self.matrix, rows)
+        return rows
+
+    def remove(self, key: str) -> Optional[int]:
+        """Tombstone the row holding `key`; returns that row, or None if the key is absent."""
+        hashed = key_hash(key)
+        row = self.row_of(key, hashed)
+        if row is None:
+            return None
+        if self._colliding_rows.pop(key, None) is None:
+            del self._rows[hashed]
+        self._valid[row] = False
+        self._dead += 1
+        return row
+
+    def vacuum(self) -> np.ndarray:
+        """
+        Re-pack the live rows to the front of the matrix in place, dropping tombstones.
+
+        Returns:
+            Array mapping each old row to its new row (-1 for removed rows)
+        """
+        live = self.live_rows()
+        mapping = np.full(len(self.keys), -1, dtype=np.intp)
+        mapping[live] = np.arange(len(live))
+        if not self._dead:
+            return mapping
+        count = len(live)
+        self._matrix[:count] = self._matrix[live]
+        self._norms[:count] = self._norms[live]
+        if self._scan is not None:
+            self._scan.codes[:count] = self._scan.codes[live]
+        self.keys = self.keys.take(live)
+        self._rebuild_lookup()
+        self._valid[:count] = True
+        self._valid[count:] = False
+        self._dead = 0
+        return mapping
+
+    def compacted(self) -> "VectorStorage":
+        """New in-memory storage holding only the live rows, renumbered densely."""
+        storage = VectorStorage(dim=self.dim, dtype=self.dtype, rerank_factor=self.rerank_factor)
+        live = self.live_rows()
+        if len(live):
+            storage._reserve(len(live))
+            storage._matrix[: len(live)] = self._matrix[live]
+            storage._norms[: len(live)] = self._norms[live]
+            storage._valid[: len(live)] = True
+            storage.keys = self.keys.take(live)
+            storage._rebuild_lookup()
+            if storage._scan is not None:
+                storage._scan.update(storage.matrix, np.arange(len(live)))
+        return storage
+
+    def vector(self, row: int) -> np.ndarray:
+        """Reconstructs the original (un-normalized) vector stored at `row`."""
+        return self._matrix[row] * self._norms[row]
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row = self.row_of(key)
+        return None if row is None else self.vector(row)
+
+    def _rebuild_lookup(self) -> None:
+        # Assumes every row is live, as after vacuum / compaction / load
+        hashes = self.keys.hashes.tolist()
+        self._rows = dict(zip(hashes, range(len(hashes))))
+        self._colliding_rows = {}
+        if len(self._rows) < len(hashes):
+            for row, hashed in enumerate(hashes):
+                if self._rows[hashed] != row:
+                    self._colliding_rows[self.keys[row]] = row
+
+    def save(self, path: str, fsync: bool = False) -> None:
+        """
+        Persist the storage to the directory `path`; with `fsync=True` every
+        file and the directory itself are flushed to disk before returning.
+
+        Layout:
+            vectors.npy   unit-normalized float32 rows (memory-mappable)
+            norms.npy     original row norms
+            keys.npy      UTF-8 key bytes, with keys_offsets.npy / keys_hashes.npy
+            scan.npy      quantized scan tier, for float16 / int8 storage
+            storage.json  settings sidecar, written last
+        """
+        if self._dead:
+            self.compacted().save(path, fsync)
+            return
+        os.makedirs(path, exist_ok=True)
+        if fsync:
+            fsync_directory(os.path.dirname(os.path.abspath(path)))
+        write_npy(os.path.join(path, "vectors.npy"), self.matrix, fsync)
+        write_npy(os.path.join(path, "norms.npy"), self.norms, fsync)
+        for name, array in self.keys.arrays().items():
+            write_npy(os.path.join(path, _KEY_FILES[name]), array, fsync)
+        sidecar = {
+            "format_version": STORAGE_FORMAT_VERSION,
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "rerank_factor": self.rerank_factor,
+        }
+        if self._scan is not None:
+            write_npy(os.path.join(path, "scan.npy"), self._scan.codes[: len(self)], fsync)
+            if self._scan.offset is not None:
+                sidecar["scan_range"] = [self._scan.low.tolist(), self._scan.high.tolist()]
+        write_json(os.path.join(path, "storage.json"), sidecar, fsync)
+
+    @classmethod
+    def load(
+        cls, path: str, mmap: bool = True, dtype: Optional[str] = None, vectors_path: Optional[str] = None
+    ) -> "VectorStorage":
+        """
+        Load storage written by `save()`.
+
+        With `mmap=True` the .npy files (including the key text) are
+        memory-mapped copy-on-write: loading only builds the key-hash lookup,
+        and processes that load the same directory share
+        one copy of the pages in the OS cache. Writes after loading touch only
+        private copies of the affected pages; growing past the loaded size
+        moves the matrix into process memory.
+
+        Args:
+            path: Directory written by `save()`
+            mmap: Memory-map the saved files instead of reading them into memory
+            dtype: Scan precision to use instead of the saved one; the scan tier
+                is then re-encoded from the full-precision rows
+            vectors_path: File to back the matrix with (see `path` of the
+                constructor); the saved rows are copied into it block by block
+        """
+        with open(os.path.join(path, "storage.json"), encoding="utf-8") as f:
+            sidecar = json.load(f)
+        if sidecar.get("format_version") != STORAGE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported storage format: {sidecar.get('format_version')}")
+
+        mmap_mode = "c" if mmap else None
+        same_dtype = dtype is None or dtype == sidecar["dtype"]
+        storage = cls(
+            dim=sidecar["dim"],
+            path=vectors_path,
+            dtype=sidecar["dtype"] if same_dtype else dtype,
+            rerank_factor=sidecar["rerank_factor"] if same_dtype else None,
+        )
+        keys = TextArena.from_arrays(
+            np.load(os.path.join(path, _KEY_FILES["buffer"]), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, _KEY_FILES["offsets"])),
+            np.load(os.path.join(path, _KEY_FILES["hashes"])),
+        )
+        matrix = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r" if vectors_path else mmap_mode)
+        norms = np.load(os.path.join(path, "norms.npy"))
+        if vectors_path is None:
+            storage._matrix, storage._norms = matrix, norms
+            storage._valid = np.ones(len(keys), dtype=bool)
+        elif len(keys):
+            storage._reserve(len(keys))
+            for start in range(0, len(keys), 65536):
+                stop = min(start + 65536, len(keys))
+                storage._matrix[start:stop] = matrix[start:stop]
+            storage._norms[: len(keys)] = norms
+            storage._valid[: len(keys)] = True
+        storage.keys = keys
+        storage._rebuild_lookup()
+        if storage._scan is not None and same_dtype:
+            storage._scan.codes = np.load(os.path.join(path, "scan.npy"), mmap_mode=mmap_mode)
+            if "scan_range" in sidecar:
+                storage._scan.set_range(*(np.array(values, dtype=np.float32) for values in sidecar["scan_range"]))
+        elif storage._scan is not None and len(keys):
+            storage._scan.update(storage.matrix, np.arange(len(keys)))
+        return storage
+
+    def cosine_scores(self, query_vector: np.ndarray) -> np.ndarray:
+        """Cosine similarity of `query_vector` against every stored row."""
+        query, _ = normalize_rows(query_vector)
+        return self.matrix @ query
+
+    def cosine_top_k(
+        self, query_vector: np.ndarray, k: int, rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k cosine matches, optionally restricted to a subset of rows.
+
+        With a quantized dtype the scan tier produces a shortlist of
+        k * rerank_factor rows, which is then re-scored at full precision.
+
+        Returns:
+            (rows, scores), best match first
+        """
+        query, _ = normalize_rows(query_vector)
+        if rows is not None and self._dead:
+            rows = rows[self._valid[rows]]
+        k = min(k, self.live_count if rows is None else len(rows))
+        if self._scan is None:
+            scores = self.matrix @ query if rows is None else self._matrix[rows] @ query
+            if rows is None and self._dead:
+                scores[~self.valid] = -np.inf
+            best = top_k(scores, k)
+            return (best if rows is None else rows[best]), scores[best]
+
+        approximate = self._scan.scores(query, len(self), rows)
+        if rows is None and self._dead:
+            approximate[~self.valid] = -np.inf
+        candidates = self.live_count if rows is None else len(rows)
+        shortlist = top_k(approximate, min(k * self.rerank_factor, candidates))
+        if rows is not None:
+            shortlist = rows[shortlist]
+        shortlist = np.sort(shortlist)
+        exact = self._matrix[shortlist] @ query
+        best = top_k(exact, k)
+        return shortlist[best], exact[best]
+
+    def metric_top_k(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        metric: Metric,
+        rows: Optional[np.ndarray] = None,
+        block_size: int = 65536,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k live rows under an arbitrary metric, optionally restricted to `rows`.
+
+        Metrics with a batched implementation score `block_size` rows per
+        call; others fall back to one `pairwise` call per row.
+
+        Returns:
+            (rows, scores), best match first
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        candidates = self.live_rows() if rows is None else rows[self._valid[rows]]
+        if metric.batched is None:
+            scores = np.array(
+                [metric.pairwise(query_vector, self.vector(row)) for row in candidates], dtype=np.float32
+            )
+        else:
+            # Without tombstones or a row filter, blocks are plain slices (no gather copy)
+            contiguous = rows is None and not self._dead
+            scores = np.empty(len(candidates), dtype=np.float32)
+            for start in range(0, len(candidates), block_size):
+                stop = min(start + block_size, len(candidates))
+                block = slice(start, stop) if contiguous else candidates[start:stop]
+                scores[start:stop] = metric.batched(query, np.asarray(self._matrix[block]), self._norms[block])
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def cosine_top_k_many(
+        self, query_matrix: np.ndarray, k: int, block_size: int = 8192
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k cosine matches for many queries at once.
+
+        The stored matrix is scanned in blocks of `block_size` rows; each block
+        is scored against all queries with a single matrix-matrix product and
+        merged into a running per-query top-k, so peak memory is bounded by
+        len(queries) * (block_size + k) scores rather than the corpus size.
+
+        Args:
+            query_matrix: 2-D array of shape (num_queries, dim)
+            k: Number of results per query
+            block_size: Number of stored rows scored per block
+
+        Returns:
+            (rows, scores), each of shape (num_queries, min(k, len(self))),
+            best match first
+        """
+        queries, _ = normalize_rows(np.atleast_2d(query_matrix))
+        k = min(k, self.live_count)
+        best_rows = np.empty((queries.shape[0], 0), dtype=np.intp)
+        best_scores = np.empty((queries.shape[0], 0), dtype=np.float32)
+        if k <= 0:
+            return best_rows, best_scores
+
+        matrix = self.matrix
+        for start in range(0, matrix.shape[0], block_size):
+            block = matrix[start : start + block_size]
+            block_rows = np.arange(start, start + block.shape[0])
+            block_scores = queries @ block.T
+            if self._dead:
+                block_scores[:, ~self._valid[start : start + block.shape[0]]] = -np.inf
+            scores = np.concatenate([best_scores, block_scores], axis=1)
+            rows = np.concatenate(
+                [best_rows, np.broadcast_to(block_rows, (queries.shape[0], block.shape[0]))],
+                axis=1,
+            )
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_rows, best_scores = rows, scores
+
+        order = np.lexsort((best_rows, -best_scores), axis=-1)
+        return (
+            np.take_along_axis(best_rows, order, axis=1),
+            np.take_along_axis(best_scores, order, axis=1),
+        )
+
+    def _reserve(self, size: int) -> None:
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2, self._initial_capacity)
+        norms = np.empty(new_capacity, dtype=np.float32)
+        norms[: len(self.keys)] = self.norms
+        valid = np.zeros(new_capacity, dtype=bool)
+        valid[: len(self.keys)] = self.valid
+        self._valid = valid
+        if self.path is None:
+            matrix = np.empty((new_capacity, self.dim), dtype=np.float32)
+            if len(self.keys):
+                matrix[: len(self.keys)] = self.matrix
+        else:
+            # Extending the file keeps the rows already written through the old mapping
+            if isinstance(self._matrix, np.memmap):
+                self._matrix.flush()
+            with open(self.path, "r+b") as f:
+                f.truncate(new_capacity * self.dim * np.dtype(np.float32).itemsize)
+            matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(new_capacity, self.dim))
+        self._matrix, self._norms = matrix, norms
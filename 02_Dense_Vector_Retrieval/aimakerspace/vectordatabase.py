@@ -1,56 +1,509 @@
 import numpy as np
-from collections import defaultdict
-from typing import List, Tuple, Callable
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union, Callable
+from aimakerspace.metrics import COSINE, cosine_similarity, get_metric
 from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.query_cache import QueryEmbeddingCache
+from aimakerspace.sharded import ShardedSearcher
+from aimakerspace.streaming import stream_embeddings
+from aimakerspace.vector_storage import (
+    VectorStorage,
+    minmax_scale,
+    mmr_select,
+    normalize_rows,
+    remap_index,
+    sync_index,
+    write_json,
+)
+from aimakerspace.wal import DELETE, UPSERT, WriteAheadLog
 import asyncio
+import json
+import os
+import shutil
+import threading
 
 
-def cosine_similarity(vector_a: np.array, vector_b: np.array) -> float:
-    """Computes the cosine similarity between two vectors."""
-    dot_product = np.dot(vector_a, vector_b)
-    norm_a = np.linalg.norm(vector_a)
-    norm_b = np.linalg.norm(vector_b)
-    return dot_product / (norm_a * norm_b)
+def _check_strategy(strategy: str) -> None:
+    if strategy not in ("similarity", "mmr"):
+        raise ValueError(f"Unknown search strategy: {strategy!r} (expected 'similarity' or 'mmr')")
 
 
 class VectorDatabase:
-    def __init__(self, embedding_model: EmbeddingModel = None):
-        self.vectors = defaultdict(np.array)
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel = None,
+        index: Any = None,
+        vectors_path: Optional[str] = None,
+        dtype: str = "float32",
+        vacuum_threshold: Optional[float] = 0.3,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+    ):
+        """
+        Args:
+            embedding_model: Model used to embed texts and queries
+            index: Optional approximate index (e.g. indexes.hnsw.HNSWIndex) that is
+                updated on every insert and used by cosine `search()`
+            vectors_path: Optional file backing the full-precision matrix on disk,
+                e.g. when a compressed index such as indexes.pq.PQIndex serves search
+            dtype: Precision of the first-pass scan ("float32", "float16", "int8" or
+                "binary" sign bits); quantized scans are re-ranked against the float32 rows
+            vacuum_threshold: Fraction of tombstoned rows at which `delete()` triggers
+                `vacuum()` automatically (None disables)
+            query_cache: Cache of query embeddings used by the `*_by_text` searches;
+                defaults to a private QueryEmbeddingCache()
+        """
+        self.storage = VectorStorage(path=vectors_path, dtype=dtype)
         self.embedding_model = embedding_model or EmbeddingModel()
+        self.query_cache = query_cache if query_cache is not None else QueryEmbeddingCache()
+        self.index = index
+        self.vacuum_threshold = vacuum_threshold
+        self.sharded: Optional[ShardedSearcher] = None
+        self._sharded_stale = False
+        self._sharded_rows: List[np.ndarray] = []  # rows written since the last publish
+        self.path: Optional[str] = None
+        self.wal: Optional[WriteAheadLog] = None
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+
+    @property
+    def vectors(self) -> Dict[str, np.array]:
+        """Materializes a key -> vector dict; prefer `storage` for bulk access."""
+        return {key: self.storage.get(key) for key in self.storage.live_keys}
 
     def insert(self, key: str, vector: np.array) -> None:
-        self.vectors[key] = vector
+        with self._lock:
+            if self.wal is not None:
+                self.wal.append_upsert(key, vector)
+            self._apply_upserts([key], np.asarray(vector)[None, :])
+
+    def upsert(self, key: str, vector: np.array) -> None:
+        """Insert `key`, or replace its vector if it already exists."""
+        self.insert(key, vector)
+
+    def delete(self, key: str) -> bool:
+        """
+        Remove `key`; returns False if it was not present.
+
+        The row is only tombstoned, so searches skip it immediately; the space
+        is reclaimed by `vacuum()` once `vacuum_threshold` is exceeded.
+        """
+        with self._lock:
+            if key not in self.storage:
+                return False
+            if self.wal is not None:
+                self.wal.append_delete(key)
+            row = self.storage.remove(key)
+            if self.sharded is not None:
+                self._sharded_rows.append(np.array([row]))
+            if self.vacuum_threshold is not None and self.storage.dead_fraction > self.vacuum_threshold:
+                self.vacuum()
+            return True
+
+    def vacuum(self) -> None:
+        """Re-pack storage without tombstoned rows and renumber the index to the new row ids."""
+        with self._lock:
+            mapping = self.storage.vacuum()
+            self._sharded_stale = True
+            if self.index is not None:
+                remap_index(self.index, self.storage.matrix, mapping)
 
     def search(
         self,
         query_vector: np.array,
         k: int,
-        distance_measure: Callable = cosine_similarity,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        strategy: str = "similarity",
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
     ) -> List[Tuple[str, float]]:
-        scores = [
-            (key, distance_measure(query_vector, vector))
-            for key, vector in self.vectors.items()
-        ]
-        return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+        """
+        Args:
+            query_vector: The query embedding
+            k: Number of results to return
+            distance_measure: Metric name ("cosine", "euclidean", "manhattan", "dot") or
+                pairwise function; registered metrics (see aimakerspace.metrics) are
+                scored in batches, other callables once per stored vector
+            strategy: "similarity" for plain top-k, or "mmr" for maximal marginal
+                relevance, which re-selects k diverse results from the top `fetch_k`
+            fetch_k: Candidates considered by MMR
+            lambda_mult: MMR trade-off between relevance (1.0) and diversity (0.0)
+        """
+        if self.storage.live_count == 0:
+            return []
+        keys = self.storage.keys
+        metric = get_metric(distance_measure)
+        if metric is COSINE:
+            ids, scores = self.search_ids(query_vector, k, strategy, fetch_k, lambda_mult)
+            return [(keys[doc_id], float(score)) for doc_id, score in zip(ids.tolist(), scores)]
+        _check_strategy(strategy)
+        fetch = max(k, fetch_k) if strategy == "mmr" else k
+        rows, scores = self.storage.metric_top_k(query_vector, fetch, metric)
+        if strategy == "mmr":
+            chosen = mmr_select(minmax_scale(scores), np.asarray(self.storage.matrix[rows]), k, lambda_mult)
+            rows, scores = rows[chosen], scores[chosen]
+        return [(keys[row], float(score)) for row, score in zip(rows.tolist(), scores)]
+
+    def search_ids(
+        self,
+        query_vector: np.array,
+        k: int,
+        strategy: str = "similarity",
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cosine top-k as arrays of int32 document ids and float32 scores, best match first.
+
+        Ids are storage rows: they stay valid until the next `vacuum()` and
+        are resolved to text with `texts_of()`, so callers that only rank,
+        merge or ship results between processes never touch the key strings.
+        With `strategy="mmr"` the results are in MMR selection order.
+        """
+        _check_strategy(strategy)
+        if self.storage.live_count == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        fetch = max(k, fetch_k) if strategy == "mmr" else k
+        if self.index is not None:
+            rows, scores = self._index_search(query_vector, fetch)
+        elif self.sharded is not None:
+            rows, scores = self._sharded_searcher().search(query_vector, fetch)
+        else:
+            rows, scores = self.storage.cosine_top_k(query_vector, fetch)
+        if strategy == "mmr":
+            chosen = mmr_select(scores, np.asarray(self.storage.matrix[rows]), k, lambda_mult)
+            rows, scores = rows[chosen], scores[chosen]
+        return np.asarray(rows, dtype=np.int32), np.asarray(scores, dtype=np.float32)
+
+    def texts_of(self, ids: Sequence[int]) -> List[str]:
+        """Resolve document ids returned by `search_ids()` / `search_many_ids()` to their keys."""
+        keys = self.storage.keys
+        return [keys[doc_id] for doc_id in np.asarray(ids).tolist()]
+
+    def id_of(self, key: str) -> Optional[int]:
+        return self.storage.row_of(key)
+
+    def _index_search(self, query_vector: np.array, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Index search that over-fetches until k live (non-deleted) rows are found."""
+        query, _ = normalize_rows(query_vector)
+        k = min(k, self.storage.live_count)
+        fetch = k
+        while True:
+            rows, scores = self.index.search(self.storage.matrix, query, fetch)
+            live = self.storage.valid[rows]
+            if live.sum() >= k or fetch >= len(self.storage):
+                return rows[live][:k], scores[live][:k]
+            fetch = min(2 * fetch + (len(rows) - int(live.sum())), len(self.storage))
 
     def search_by_text(
         self,
         query_text: str,
         k: int,
-        distance_measure: Callable = cosine_similarity,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        return_as_text: bool = False,
+        strategy: str = "similarity",
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+    ) -> List[Tuple[str, float]]:
+        query_vector = self.query_cache.embed(self.embedding_model, query_text)
+        results = self.search(query_vector, k, distance_measure, strategy, fetch_k, lambda_mult)
+        return [result[0] for result in results] if return_as_text else results
+
+    async def asearch_by_text(
+        self,
+        query_text: str,
+        k: int,
+        distance_measure: Union[str, Callable] = cosine_similarity,
         return_as_text: bool = False,
+        strategy: str = "similarity",
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
     ) -> List[Tuple[str, float]]:
-        query_vector = self.embedding_model.get_embedding(query_text)
-        results = self.search(query_vector, k, distance_measure)
+        """`search_by_text()` that awaits the embedding request instead of blocking the event loop."""
+        query_vector = await self.query_cache.aembed(self.embedding_model, query_text)
+        results = self.search(query_vector, k, distance_measure, strategy, fetch_k, lambda_mult)
         return [result[0] for result in results] if return_as_text else results
 
+    def search_many(
+        self, query_matrix: np.array, k: int, block_size: int = 8192
+    ) -> List[List[Tuple[str, float]]]:
+        """Cosine top-k for each row of `query_matrix`, scored in corpus blocks."""
+        ids, scores = self.search_many_ids(query_matrix, k, block_size)
+        keys = self.storage.keys
+        return [
+            [(keys[doc_id], float(score)) for doc_id, score in zip(query_ids, query_scores)]
+            for query_ids, query_scores in zip(ids.tolist(), scores)
+        ]
+
+    def search_many_ids(
+        self, query_matrix: np.array, k: int, block_size: int = 8192
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Like `search_many()`, but returns (num_queries, k) arrays of document ids and scores."""
+        if self.sharded is not None:
+            rows, scores = self._sharded_searcher().search_many(query_matrix, k)
+        else:
+            rows, scores = self.storage.cosine_top_k_many(query_matrix, k, block_size)
+        return np.asarray(rows, dtype=np.int32), np.asarray(scores, dtype=np.float32)
+
+    def search_many_by_text(
+        self,
+        query_texts: List[str],
+        k: int,
+        return_as_text: bool = False,
+        block_size: int = 8192,
+    ) -> List[List[Tuple[str, float]]]:
+        if not query_texts:
+            return []
+        query_matrix = self.query_cache.embed_many(self.embedding_model, query_texts)
+        results = self.search_many(query_matrix, k, block_size)
+        if return_as_text:
+            return [[result[0] for result in query_results] for query_results in results]
+        return results
+
     def retrieve_from_key(self, key: str) -> np.array:
-        return self.vectors.get(key, None)
+        return self.storage.get(key)
+
+    def save(self, path: str) -> None:
+        """
+        Persist embeddings and keys to the directory `path` (see VectorStorage.save).
+
+        An index with a `save()` method (IVFIndex) is written next to them as
+        `index.npz`; tombstoned rows are vacuumed first so that it lines up
+        with the saved rows.
+        """
+        with self._lock:
+            persist_index = self.index is not None and hasattr(self.index, "save")
+            if persist_index and self.storage.dead_fraction:
+                self.vacuum()
+            self.storage.save(path)
+            if persist_index:
+                self.index.save(os.path.join(path, "index.npz"))
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        embedding_model: EmbeddingModel = None,
+        mmap: bool = True,
+        index: Any = None,
+        dtype: Optional[str] = None,
+        vectors_path: Optional[str] = None,
+        vacuum_threshold: Optional[float] = 0.3,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+    ) -> "VectorDatabase":
+        """
+        Open a database written by `save()` without re-embedding anything.
+
+        With `mmap=True` the embedding matrix is memory-mapped, so startup cost
+        is independent of corpus size and worker processes on one host share
+        its pages. An `index`, if given, is built over the loaded rows, unless
+        it already covers them, as one restored with
+        `IVFIndex.load(os.path.join(path, "index.npz"))` does.
+        `dtype` (default: the saved one), `vectors_path`, `vacuum_threshold`
+        and `query_cache` are as for the constructor.
+        """
+        vector_db = cls(
+            embedding_model=embedding_model,
+            index=index,
+            vectors_path=vectors_path,
+            dtype=dtype or "float32",
+            vacuum_threshold=vacuum_threshold,
+            query_cache=query_cache,
+        )
+        vector_db.storage = VectorStorage.load(path, mmap=mmap, dtype=dtype, vectors_path=vectors_path)
+        if index is not None:
+            sync_index(index, vector_db.storage.matrix)
+        return vector_db
+
+    @classmethod
+    def open(
+        cls,
+        path: str,
+        embedding_model: EmbeddingModel = None,
+        index: Any = None,
+        mmap: bool = True,
+        fsync: bool = False,
+        dtype: Optional[str] = None,
+        vectors_path: Optional[str] = None,
+        vacuum_threshold: Optional[float] = 0.3,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+    ) -> "VectorDatabase":
+        """
+        Open (or create) a durable database in the directory `path`.
+
+        The latest snapshot is loaded (memory-mapped when `mmap=True`) and the
+        write-ahead log segments written since that snapshot are replayed on
+        top of it. From then on every insert and delete is appended to the log
+        before it is applied, so ingest cost is proportional to the change,
+        not the corpus. Call `compact()` to fold the log into a new snapshot.
+        `dtype` (default: the snapshot's, or "float32" for a new database),
+        `vectors_path`, `vacuum_threshold` and `query_cache` are as for the
+        constructor.
+
+        Layout:
+            CURRENT               JSON naming the live snapshot and first log segment to replay
+            snapshot-NNNNNN/      VectorStorage.save() output
+            wal/wal-NNNNNN.log    write-ahead log segments
+        """
+        os.makedirs(path, exist_ok=True)
+        vector_db = cls(
+            embedding_model=embedding_model,
+            vectors_path=vectors_path,
+            dtype=dtype or "float32",
+            vacuum_threshold=vacuum_threshold,
+            query_cache=query_cache,
+        )
+        current = cls._read_current(path)
+        if current["snapshot"]:
+            vector_db.storage = VectorStorage.load(
+                os.path.join(path, current["snapshot"]), mmap=mmap, dtype=dtype, vectors_path=vectors_path
+            )
+
+        wal = WriteAheadLog(os.path.join(path, "wal"), fsync=fsync)
+        keys, vectors = [], []
+        for op, key, vector, _ in wal.replay(current["wal_start"]):
+            if op == UPSERT:
+                keys.append(key)
+                vectors.append(vector)
+                continue
+            if keys:
+                vector_db.storage.add_batch(keys, np.stack(vectors))
+                keys, vectors = [], []
+            if op == DELETE:
+                vector_db.storage.remove(key)
+        if keys:
+            vector_db.storage.add_batch(keys, np.stack(vectors))
+
+        vector_db.index = index
+        if index is not None and len(vector_db.storage):
+            index.add(vector_db.storage.matrix, np.arange(len(vector_db.storage)))
+        vector_db.path, vector_db.wal = path, wal
+        return vector_db
+
+    def compact(self, background: bool = False) -> Optional[threading.Thread]:
+        """
+        Merge the current state into a new snapshot and drop the log segments it covers.
+
+        The log is rolled and the live rows are copied while holding the write
+        lock; writing the snapshot happens outside it, so inserts can continue
+        (they land in the new log segment). With `background=True` the write
+        runs in a daemon thread, which is returned.
+        """
+        if self.wal is None:
+            raise ValueError("compact() requires a database created with VectorDatabase.open()")
+        with self._lock:
+            wal_start = self.wal.roll()
+            snapshot = self.storage.compacted()
+        # close() may drop self.wal while a background write is still running
+        wal, path = self.wal, self.path
+
+        def write_snapshot():
+            with self._compaction_lock:
+                current = self._read_current(path)
+                if current["wal_start"] >= wal_start:
+                    # A later compaction finished first; its snapshot already covers this one
+                    return
+                name = f"snapshot-{wal_start:06d}"
+                # With fsync, the snapshot and CURRENT must be on disk before the log segments go
+                snapshot.save(os.path.join(path, name), fsync=wal.fsync)
+                previous = current["snapshot"]
+                write_json(os.path.join(path, "CURRENT"), {"snapshot": name, "wal_start": wal_start}, wal.fsync)
+                wal.remove_segments_before(wal_start)
+                if previous and previous != name:
+                    shutil.rmtree(os.path.join(path, previous), ignore_errors=True)
+
+        if not background:
+            write_snapshot()
+            return None
+        thread = threading.Thread(target=write_snapshot, daemon=True)
+        thread.start()
+        return thread
+
+    def start_sharded_search(self, n_workers: Optional[int] = None, n_shards: Optional[int] = None) -> None:
+        """
+        Serve exact cosine `search()` / `search_many()` from worker processes.
+
+        The matrix is published once to shared memory and split into row
+        shards (see aimakerspace.sharded.ShardedSearcher). Writes mark the
+        shared copy stale; the next search publishes only the rows written
+        since, or the whole matrix after a vacuum renumbered the rows.
+        """
+        self.stop_sharded_search()
+        self.sharded = ShardedSearcher(self.storage, n_workers=n_workers, n_shards=n_shards)
+        self._sharded_stale = False
+        self._sharded_rows = []
+
+    def stop_sharded_search(self) -> None:
+        if self.sharded is not None:
+            self.sharded.close()
+            self.sharded = None
+
+    def _sharded_searcher(self) -> ShardedSearcher:
+        with self._lock:
+            if self._sharded_stale:
+                self.sharded.refresh(self.storage)
+            elif self._sharded_rows:
+                self.sharded.refresh(self.storage, np.concatenate(self._sharded_rows))
+            self._sharded_stale = False
+            self._sharded_rows = []
+        return self.sharded
+
+    def close(self) -> None:
+        self.stop_sharded_search()
+        if self.wal is not None:
+            self.wal.close()
+            self.wal = None
+
+    @staticmethod
+    def _read_current(path: str) -> Dict:
+        current_path = os.path.join(path, "CURRENT")
+        if not os.path.exists(current_path):
+            return {"snapshot": None, "wal_start": 1}
+        with open(current_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _apply_upserts(self, keys: List[str], vectors: np.ndarray) -> None:
+        rows = self.storage.add_batch(keys, vectors)
+        if self.sharded is not None:
+            self._sharded_rows.append(rows)
+        if self.index is not None:
+            self.index.add(self.storage.matrix, rows)
+
+    def _insert_batch(self, keys: List[str], vectors: np.ndarray, _=None) -> None:
+        with self._lock:
+            if self.wal is not None:
+                self.wal.append_upserts(keys, vectors)
+            self._apply_upserts(keys, vectors)
 
     async def abuild_from_list(self, list_of_text: List[str]) -> "VectorDatabase":
+        """
+        Embed and insert `list_of_text`.
+
+        The insert (and index maintenance, which dominates for HNSWIndex) runs
+        in a worker thread, so the event loop keeps serving other requests;
+        searches see the new rows once the batch has been written.
+        """
         embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
-        for text, embedding in zip(list_of_text, embeddings):
-            self.insert(text, np.array(embedding))
+        if embeddings:
+            await asyncio.to_thread(self._insert_batch, list_of_text, np.array(embeddings))
+        return self
+
+    async def abuild_from_stream(
+        self,
+        texts: Any,
+        batch_size: int = 256,
+        max_in_flight: int = 4,
+        progress: Optional[Callable[[Dict], None]] = None,
+    ) -> "VectorDatabase":
+        """
+        Build incrementally from a sync or async iterable of texts.
+
+        At most `max_in_flight` embedding requests of `batch_size` texts run
+        concurrently, and each batch is inserted (and logged, for databases
+        from `open()`) as soon as it is embedded, so searches see documents
+        while ingestion is still running. `progress` receives the running
+        documents / batches / elapsed / docs_per_second stats after every batch.
+        Inserts run in a worker thread, as for `abuild_from_list()`.
+        """
+        await stream_embeddings(self.embedding_model, texts, self._insert_batch, batch_size, max_in_flight, progress)
         return self
 
 
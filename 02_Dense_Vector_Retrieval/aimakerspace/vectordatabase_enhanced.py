@@ -1,29 +1,32 @@
+import math
 import numpy as np
-from collections import defaultdict
-from typing import List, Tuple, Callable, Dict, Optional
+from typing import Any, List, Sequence, Tuple, Callable, Dict, Optional, Union
+from aimakerspace.metrics import (
+    COSINE,
+    cosine_similarity,
+    euclidean_distance,
+    get_metric,
+    manhattan_distance,
+)
+from aimakerspace.metadata_filter import MetadataFilter, compile_filter
+from aimakerspace.metadata_index import MetadataIndex
+from aimakerspace.metadata_store import MetadataStore
 from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.query_cache import QueryEmbeddingCache
+from aimakerspace.streaming import stream_embeddings
+from aimakerspace.vector_storage import (
+    VectorStorage,
+    minmax_scale,
+    mmr_select,
+    normalize_rows,
+    remap_index,
+    sync_index,
+    write_json,
+)
 import asyncio
-
-
-def cosine_similarity(vector_a: np.array, vector_b: np.array) -> float:
-    """Computes the cosine similarity between two vectors."""
-    dot_product = np.dot(vector_a, vector_b)
-    norm_a = np.linalg.norm(vector_a)
-    norm_b = np.linalg.norm(vector_b)
-    return dot_product / (norm_a * norm_b)
-
-
-def euclidean_distance(vector_a: np.array, vector_b: np.array) -> float:
-    """Computes the Euclidean distance between two vectors (inverted for ranking)."""
-    distance = np.linalg.norm(vector_a - vector_b)
-    # Return inverse so that smaller distances (more similar) rank higher
-    return 1 / (1 + distance)
-
-
-def manhattan_distance(vector_a: np.array, vector_b: np.array) -> float:
-    """Computes the Manhattan distance between two vectors (inverted for ranking)."""
-    distance = np.sum(np.abs(vector_a - vector_b))
-    return 1 / (1 + distance)
+import json
+import os
+import threading
 
 
 class VectorDatabaseWithMetadata:
@@ -32,27 +35,123 @@ class VectorDatabaseWithMetadata:
 
     Features:
     - Metadata storage for each document (year, source, topic, etc.)
-    - Multiple distance metrics (cosine, euclidean, manhattan)
-    - Metadata-based filtering during search
-    - Statistics and analytics on stored documents
+    - Multiple distance metrics (cosine, euclidean, manhattan, dot), scored in
+      batches over the storage matrix
+    - Metadata-based filtering during search ($gte / $in / $ne / $or / $not ...),
+      compiled to NumPy masks over the metadata code columns and planned by
+      selectivity: rare matches are pre-filtered and scored directly, common
+      ones are post-filtered from an over-fetched scan (see `explain()`)
+    - Maximal marginal relevance (MMR) search for diverse results
+    - Columnar, dictionary-encoded metadata with statistics (counts, distinct
+      values, histograms) maintained on every insert and delete
+    - Contiguous float32 storage with an optional float16 / int8 scan tier
+    - Deletes and updates via tombstones, with periodic vacuuming
+    - Async text search with an LRU / TTL cache of query embeddings
+    - Optional approximate index for cosine search
     """
 
-    def __init__(self, embedding_model: EmbeddingModel = None):
-        self.vectors = {}  # key -> vector
-        self.metadata = {}  # key -> metadata dict
+    # Cost of scoring one pre-filtered row (a random gather) relative to one
+    # row of a contiguous scan
+    PREFILTER_ROW_COST = 2.0
+    # Post-filtering fetches fetch_k / selectivity candidates times this margin
+    OVERSAMPLE = 1.5
+
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel = None,
+        dtype: str = "float32",
+        vectors_path: Optional[str] = None,
+        vacuum_threshold: Optional[float] = 0.3,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        index: Any = None,
+    ):
+        """
+        Args:
+            embedding_model: Model used to embed texts and queries
+            dtype: Precision of the first-pass cosine scan ("float32", "float16", "int8"
+                or "binary" sign bits); quantized scans are re-ranked against the float32 rows
+            vectors_path: Optional file backing the full-precision matrix on disk
+            vacuum_threshold: Fraction of tombstoned rows at which `delete()` triggers
+                `vacuum()` automatically (None disables)
+            query_cache: Cache of query embeddings used by `search_by_text()` /
+                `asearch_by_text()`; defaults to a private QueryEmbeddingCache()
+            index: Optional approximate index (e.g. indexes.hnsw.HNSWIndex) that is
+                updated on every insert and serves unfiltered and post-filtered
+                cosine searches
+        """
+        self.storage = VectorStorage(path=vectors_path, dtype=dtype)
+        self.metadata_store = MetadataStore()  # row-aligned with storage
+        self.metadata_index = MetadataIndex(self.metadata_store)  # filter lookups over its columns
         self.embedding_model = embedding_model or EmbeddingModel()
+        self.query_cache = query_cache if query_cache is not None else QueryEmbeddingCache()
+        self.vacuum_threshold = vacuum_threshold
+        self.index = index
+        self._lock = threading.RLock()  # serializes writers; batch inserts run in worker threads
+
+    @property
+    def vectors(self) -> Dict[str, np.array]:
+        """Materializes a key -> vector dict; prefer `storage` for bulk access."""
+        return {key: self.storage.get(key) for key in self.storage.live_keys}
+
+    @property
+    def metadata(self) -> Dict[str, Dict]:
+        """Materializes a key -> metadata dict of the live documents."""
+        keys = self.storage.keys
+        return {keys[row]: metadata for row, metadata in self.metadata_store.items(self.storage.live_rows())}
 
     def insert(self, key: str, vector: np.array, metadata: Optional[Dict] = None) -> None:
         """Insert a vector with optional metadata."""
-        self.vectors[key] = vector
-        self.metadata[key] = metadata or {}
+        self._add_rows([key], np.asarray(vector)[None, :], [metadata])
+
+    def _add_rows(self, keys: List[str], vectors: np.ndarray, metadata_list: Sequence[Optional[Dict]]) -> None:
+        with self._lock:
+            rows = self.storage.add_batch(keys, vectors)
+            self._set_metadata(rows, metadata_list)
+            if self.index is not None:
+                self.index.add(self.storage.matrix, rows)
+
+    def _set_metadata(self, rows: Sequence[int], metadata_list: Sequence[Optional[Dict]]) -> None:
+        for row, metadata in zip(rows, metadata_list):
+            self.metadata_store.set(row, metadata)
+
+    def upsert(self, key: str, vector: np.array, metadata: Optional[Dict] = None) -> None:
+        """Insert `key`, or replace its vector and metadata if it already exists."""
+        self.insert(key, vector, metadata)
+
+    def delete(self, key: str) -> bool:
+        """
+        Remove `key` and its metadata; returns False if it was not present.
+
+        The row is only tombstoned, so searches skip it immediately; the space
+        is reclaimed by `vacuum()` once `vacuum_threshold` is exceeded.
+        """
+        with self._lock:
+            row = self.storage.remove(key)
+            if row is None:
+                return False
+            self.metadata_store.clear(row)
+            if self.vacuum_threshold is not None and self.storage.dead_fraction > self.vacuum_threshold:
+                self.vacuum()
+            return True
+
+    def vacuum(self) -> None:
+        """Re-pack storage without tombstoned rows and renumber the indexes to the new rows."""
+        with self._lock:
+            mapping = self.storage.vacuum()
+            self.metadata_store = self.metadata_store.take(np.flatnonzero(mapping >= 0))
+            self.metadata_index = MetadataIndex(self.metadata_store)
+            if self.index is not None:
+                remap_index(self.index, self.storage.matrix, mapping)
 
     def search(
         self,
         query_vector: np.array,
         k: int,
-        distance_measure: Callable = cosine_similarity,
-        filter_metadata: Optional[Dict] = None,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        filter_metadata: Optional[Union[Dict, MetadataFilter]] = None,
+        strategy: str = "similarity",
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
     ) -> List[Tuple[str, float, Dict]]:
         """
         Search for similar vectors with optional metadata filtering.
@@ -60,47 +159,162 @@ class VectorDatabaseWithMetadata:
         Args:
             query_vector: The query vector to search for
             k: Number of results to return
-            distance_measure: Distance function to use (cosine_similarity, euclidean_distance, manhattan_distance)
-            filter_metadata: Optional dict to filter results (e.g., {"year": "2025", "topic": "investment"})
+            distance_measure: Metric name ("cosine", "euclidean", "manhattan", "dot") or
+                function (cosine_similarity, euclidean_distance, manhattan_distance, ...);
+                unregistered functions are called once per stored vector
+            filter_metadata: Optional filter, either exact matches (e.g., {"year": "2025",
+                "topic": "investment"}) or the operator DSL of MetadataFilter (e.g.,
+                {"year": {"$gte": 2023}, "source": {"$in": [...]}}), or a compiled MetadataFilter
+            strategy: "similarity" for plain top-k, or "mmr" (maximal marginal relevance)
+                to re-select k diverse results from the best `fetch_k` matches
+            fetch_k: Number of candidates considered by MMR
+            lambda_mult: MMR trade-off between relevance (1.0) and diversity (0.0)
 
         Returns:
             List of tuples: (text, score, metadata)
         """
-        # Apply metadata filtering if specified
-        filtered_items = self.vectors.items()
-        if filter_metadata:
-            filtered_items = [
-                (key, vector)
-                for key, vector in self.vectors.items()
-                if self._matches_filter(key, filter_metadata)
-            ]
+        if strategy not in ("similarity", "mmr"):
+            raise ValueError(f"Unknown search strategy: {strategy!r} (expected 'similarity' or 'mmr')")
+        keys = self.storage.keys
+        fetch = max(k, fetch_k) if strategy == "mmr" else k
+        if self.storage.live_count == 0:
+            return []
+        compiled = compile_filter(filter_metadata) if filter_metadata else None
+        metric = get_metric(distance_measure)
+        plan = self._plan(compiled, fetch, metric)
+
+        if plan["plan"] == "pre_filter":
+            # Only the matching rows are scored
+            rows = compiled.rows(self.metadata_index, self.storage.valid)
+            if len(rows) == 0:
+                return []
+            if metric is COSINE:
+                best_rows, best_scores = self.storage.cosine_top_k(query_vector, fetch, rows)
+            else:
+                best_rows, best_scores = self.storage.metric_top_k(query_vector, fetch, metric, rows)
+        elif plan["plan"] == "full_scan":
+            if metric is COSINE:
+                best_rows, best_scores = self.storage.cosine_top_k(query_vector, fetch)
+            else:
+                best_rows, best_scores = self.storage.metric_top_k(query_vector, fetch, metric)
         else:
-            filtered_items = list(self.vectors.items())
+            accept = self.storage.valid
+            if compiled is not None:
+                accept = compiled.mask(self.metadata_index, len(accept)) & accept
+            best_rows, best_scores = self._post_filter_search(query_vector, fetch, accept, plan["fetch"])
+
+        # Re-select diverse results from the candidates (redundancy is measured by cosine,
+        # so other metrics' scores are rescaled to the same range first)
+        if strategy == "mmr":
+            relevance = best_scores if metric is COSINE else minmax_scale(best_scores)
+            chosen = mmr_select(relevance, np.asarray(self.storage.matrix[best_rows]), k, lambda_mult)
+            best_rows, best_scores = best_rows[chosen], best_scores[chosen]
 
-        # Calculate scores
-        scores = [
-            (key, distance_measure(query_vector, vector), self.metadata.get(key, {}))
-            for key, vector in filtered_items
+        return [
+            (keys[row], float(score), self.metadata_store.get(row))
+            for row, score in zip(best_rows.tolist(), best_scores)
         ]
 
-        # Sort by score (descending) and return top k
-        return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+    def explain(
+        self,
+        k: int,
+        filter_metadata: Optional[Union[Dict, MetadataFilter]] = None,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        strategy: str = "similarity",
+        fetch_k: int = 20,
+    ) -> Dict:
+        """
+        Describe how `search()` would execute with these arguments.
 
-    def _matches_filter(self, key: str, filter_metadata: Dict) -> bool:
-        """Check if a document's metadata matches the filter criteria."""
-        doc_metadata = self.metadata.get(key, {})
-        for filter_key, filter_value in filter_metadata.items():
-            if doc_metadata.get(filter_key) != filter_value:
-                return False
-        return True
+        Filter selectivity is estimated from the per-value document counts
+        of the metadata columns (equality and membership are exact, `$and` / `$or` assume
+        independent terms). Pre-filtering scores only the matching rows and
+        costs about PREFILTER_ROW_COST per match; post-filtering searches
+        the index (or scans every row) for fetch_k / selectivity candidates
+        and drops the non-matching ones, widening the search when too few
+        survive. Costs are in units of one scored row. Non-cosine metrics are
+        always pre-filtered.
+
+        Returns:
+            Dict with the chosen "plan" ("pre_filter", "post_filter", "index_scan"
+            or "full_scan"), "estimated_selectivity", "estimated_matches",
+            "actual_matches", "live_documents", the candidate "fetch" of a
+            post-filter, the "costs" of each considered plan and the "index" type
+        """
+        fetch = max(k, fetch_k) if strategy == "mmr" else k
+        compiled = compile_filter(filter_metadata) if filter_metadata else None
+        plan = self._plan(compiled, fetch, get_metric(distance_measure))
+        if compiled is None:
+            plan["actual_matches"] = self.storage.live_count
+        else:
+            plan["actual_matches"] = len(compiled.rows(self.metadata_index, self.storage.valid))
+        return plan
+
+    def _plan(self, compiled: Optional[MetadataFilter], fetch: int, metric: Any) -> Dict:
+        live = self.storage.live_count
+        selectivity = 1.0 if compiled is None else compiled.selectivity(self.metadata_index, live)
+        plan = {
+            "plan": "full_scan",
+            "estimated_selectivity": selectivity,
+            "estimated_matches": int(round(selectivity * live)),
+            "live_documents": live,
+            "fetch": None,
+            "costs": {},
+            "index": type(self.index).__name__ if self.index is not None else None,
+        }
+        use_index = self.index is not None and metric is COSINE
+        if compiled is None:
+            if use_index:
+                plan["plan"], plan["fetch"] = "index_scan", fetch
+            return plan
+
+        pre_cost = selectivity * live * self.PREFILTER_ROW_COST
+        plan["costs"]["pre_filter"] = pre_cost
+        if metric is not COSINE:
+            plan["plan"] = "pre_filter"
+            return plan
+        oversampled = min(live, math.ceil(fetch / max(selectivity, 1 / max(live, 1)) * self.OVERSAMPLE))
+        # An index visits roughly log2(n) candidates per result; a scan touches every row
+        post_cost = oversampled * math.log2(max(live, 2)) if use_index else float(live)
+        plan["costs"]["post_filter"] = post_cost
+        if pre_cost <= post_cost:
+            plan["plan"] = "pre_filter"
+        else:
+            plan["plan"], plan["fetch"] = "post_filter", oversampled
+        return plan
+
+    def _post_filter_search(
+        self, query_vector: np.array, k: int, accept: np.ndarray, fetch: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Cosine top-k among the `accept`-ed rows, over-fetching unfiltered candidates until k survive."""
+        k = min(k, int(accept.sum()))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query, _ = normalize_rows(query_vector)
+        fetch = max(fetch, k)
+        while True:
+            if self.index is not None:
+                rows, scores = self.index.search(self.storage.matrix, query, fetch)
+            else:
+                rows, scores = self.storage.cosine_top_k(query_vector, fetch)
+            keep = accept[rows]
+            if keep.sum() >= k:
+                return rows[keep][:k], scores[keep][:k]
+            if fetch >= len(self.storage):
+                # Even a full-width search came up short: score the matches directly
+                return self.storage.cosine_top_k(query_vector, k, np.flatnonzero(accept))
+            fetch = min(2 * fetch, len(self.storage))
 
     def search_by_text(
         self,
         query_text: str,
         k: int,
-        distance_measure: Callable = cosine_similarity,
-        filter_metadata: Optional[Dict] = None,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        filter_metadata: Optional[Union[Dict, MetadataFilter]] = None,
         return_as_text: bool = False,
+        strategy: str = "similarity",
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
     ) -> List[Tuple[str, float, Dict]]:
         """
         Search by text query with optional metadata filtering.
@@ -109,11 +323,40 @@ class VectorDatabaseWithMetadata:
             query_text: The text query to search for
             k: Number of results to return
             distance_measure: Distance function to use
-            filter_metadata: Optional dict to filter results
+            filter_metadata: Optional metadata filter (see `search()`)
             return_as_text: If True, return only text; if False, return (text, score, metadata)
+            strategy, fetch_k, lambda_mult: See `search()`
+        """
+        query_vector = self.query_cache.embed(self.embedding_model, query_text)
+        results = self.search(
+            query_vector, k, distance_measure, filter_metadata, strategy, fetch_k, lambda_mult
+        )
+
+        if return_as_text:
+            return [result[0] for result in results]
+        return results
+
+    async def asearch_by_text(
+        self,
+        query_text: str,
+        k: int,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        filter_metadata: Optional[Union[Dict, MetadataFilter]] = None,
+        return_as_text: bool = False,
+        strategy: str = "similarity",
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+    ) -> List[Tuple[str, float, Dict]]:
+        """
+        Async variant of `search_by_text()` for use inside an event loop.
+
+        The query embedding is awaited via `async_get_embedding`, and repeated
+        queries are answered from `query_cache` without calling the API.
         """
-        query_vector = self.embedding_model.get_embedding(query_text)
-        results = self.search(query_vector, k, distance_measure, filter_metadata)
+        query_vector = await self.query_cache.aembed(self.embedding_model, query_text)
+        results = self.search(
+            query_vector, k, distance_measure, filter_metadata, strategy, fetch_k, lambda_mult
+        )
 
         if return_as_text:
             return [result[0] for result in results]
@@ -121,7 +364,10 @@ class VectorDatabaseWithMetadata:
 
     def retrieve_from_key(self, key: str) -> Tuple[np.array, Dict]:
         """Retrieve vector and metadata for a specific key."""
-        return self.vectors.get(key, None), self.metadata.get(key, {})
+        row = self.storage.row_of(key)
+        if row is None:
+            return None, {}
+        return self.storage.vector(row), self.metadata_store.get(row)
 
     async def abuild_from_list(
         self,
@@ -134,44 +380,129 @@ class VectorDatabaseWithMetadata:
         Args:
             list_of_text: List of text documents
             metadata_list: Optional list of metadata dicts (same length as list_of_text)
+
+        The insert (and index maintenance, which dominates for HNSWIndex) runs
+        in a worker thread, so the event loop keeps serving other requests.
         """
         embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
 
         if metadata_list is None:
             metadata_list = [{}] * len(list_of_text)
 
-        for text, embedding, metadata in zip(list_of_text, embeddings, metadata_list):
-            self.insert(text, np.array(embedding), metadata)
+        if embeddings:
+            await asyncio.to_thread(self._add_rows, list_of_text, np.array(embeddings), metadata_list)
 
         return self
 
-    def get_statistics(self) -> Dict:
-        """Get statistics about the stored documents."""
-        stats = {
-            "total_documents": len(self.vectors),
-            "metadata_fields": set(),
-            "metadata_values": defaultdict(set),
-        }
+    async def abuild_from_stream(
+        self,
+        items: Any,
+        batch_size: int = 256,
+        max_in_flight: int = 4,
+        progress: Optional[Callable[[Dict], None]] = None,
+    ) -> "VectorDatabaseWithMetadata":
+        """
+        Build incrementally from a stream of documents.
 
-        for metadata in self.metadata.values():
-            for key, value in metadata.items():
-                stats["metadata_fields"].add(key)
-                stats["metadata_values"][key].add(value)
+        Args:
+            items: Sync or async iterable of texts or (text, metadata) pairs
+            batch_size: Texts per embedding request
+            max_in_flight: Maximum concurrent embedding requests; each batch is
+                inserted (in a worker thread) as soon as its embeddings arrive
+            progress: Optional callback receiving documents / batches / elapsed /
+                docs_per_second after every batch
+        """
 
-        # Convert sets to lists for JSON serialization
-        stats["metadata_fields"] = list(stats["metadata_fields"])
-        stats["metadata_values"] = {
-            k: list(v) for k, v in stats["metadata_values"].items()
-        }
+        await stream_embeddings(self.embedding_model, items, self._add_rows, batch_size, max_in_flight, progress)
+        return self
 
-        return stats
+    def save(self, path: str) -> None:
+        """
+        Persist embeddings, keys and metadata to the directory `path`.
 
-    def filter_by_metadata(self, filter_dict: Dict) -> List[str]:
-        """Get all document keys that match the given metadata filter."""
-        return [
-            key for key in self.vectors.keys()
-            if self._matches_filter(key, filter_dict)
-        ]
+        Metadata is stored in a `metadata.json` sidecar aligned with the
+        storage rows (see VectorStorage.save for the rest of the layout). An
+        index with a `save()` method (IVFIndex) is written as `index.npz`,
+        after vacuuming tombstoned rows so that it lines up with them.
+        """
+        with self._lock:
+            persist_index = self.index is not None and hasattr(self.index, "save")
+            if persist_index and self.storage.dead_fraction:
+                self.vacuum()
+            self.storage.save(path)
+            write_json(
+                os.path.join(path, "metadata.json"),
+                [metadata for _, metadata in self.metadata_store.items(self.storage.live_rows())],
+            )
+            if persist_index:
+                self.index.save(os.path.join(path, "index.npz"))
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        embedding_model: EmbeddingModel = None,
+        mmap: bool = True,
+        index: Any = None,
+        dtype: Optional[str] = None,
+        vectors_path: Optional[str] = None,
+        vacuum_threshold: Optional[float] = 0.3,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+    ) -> "VectorDatabaseWithMetadata":
+        """
+        Open a database written by `save()` without re-embedding anything.
+
+        Args:
+            path: Directory written by `save()`
+            embedding_model: Model used for subsequent text queries
+            mmap: Memory-map the embedding matrix instead of reading it into memory
+            index: Optional approximate index, built over the loaded rows unless it
+                already covers them (e.g. IVFIndex.load(os.path.join(path, "index.npz")))
+            dtype: Scan precision; defaults to the saved one
+            vectors_path, vacuum_threshold, query_cache: As for the constructor
+        """
+        vector_db = cls(
+            embedding_model=embedding_model,
+            dtype=dtype or "float32",
+            vectors_path=vectors_path,
+            vacuum_threshold=vacuum_threshold,
+            query_cache=query_cache,
+            index=index,
+        )
+        vector_db.storage = VectorStorage.load(path, mmap=mmap, dtype=dtype, vectors_path=vectors_path)
+        with open(os.path.join(path, "metadata.json"), encoding="utf-8") as f:
+            for row, metadata in enumerate(json.load(f)):
+                vector_db.metadata_store.set(row, metadata)
+        if index is not None:
+            sync_index(index, vector_db.storage.matrix)
+        return vector_db
+
+    def get_statistics(self) -> Dict:
+        """
+        Get statistics about the stored documents.
+
+        Served from the per-field statistics of `metadata_store`, which are
+        kept up to date on insert and delete, so the cost depends on the
+        number of fields and distinct values rather than on the documents.
+        "field_stats" holds each field's type, document count, distinct
+        count and histogram (see MetadataStore.statistics).
+        """
+        field_stats = self.metadata_store.statistics()
+        return {
+            "total_documents": self.storage.live_count,
+            "metadata_fields": list(field_stats),
+            "metadata_values": {field: list(stats["values"]) for field, stats in field_stats.items()},
+            "field_stats": field_stats,
+        }
+
+    def filter_by_metadata(self, filter_dict: Union[Dict, MetadataFilter]) -> List[str]:
+        """Get all document keys that match the given metadata filter (see MetadataFilter)."""
+        keys = self.storage.keys
+        if filter_dict:
+            rows = compile_filter(filter_dict).rows(self.metadata_index, self.storage.valid)
+        else:
+            rows = self.storage.live_rows()
+        return [keys[row] for row in rows.tolist()]
 
 
 if __name__ == "__main__":
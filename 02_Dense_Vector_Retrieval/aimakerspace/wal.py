@@ -0,0 +1,156 @@
+import json
+import os
+import re
+import struct
+import zlib
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aimakerspace.vector_storage import fsync_directory
+
+UPSERT = 1
+DELETE = 2
+
+# op, key length, metadata length, vector length (in float32 values), crc32 of the payload
+_HEADER = struct.Struct("<BIIII")
+_SEGMENT_PATTERN = re.compile(r"^wal-(\d{6})\.log$")
+
+
+class WriteAheadLog:
+    """
+    Append-only log of vector database mutations, split into numbered segments.
+
+    Each record is a fixed header followed by the UTF-8 key, optional JSON
+    metadata and the float32 vector. A CRC32 over the payload lets `replay()`
+    stop cleanly at a torn final record after a crash.
+
+    Args:
+        path: Directory holding the `wal-NNNNNN.log` segment files
+        fsync: If True, fsync after every append (and the directory after a
+            segment is created or removed) for durability across power loss
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        os.makedirs(path, exist_ok=True)
+        segments = self.segments()
+        self.segment_id = segments[-1] if segments else 1
+        self._truncate_torn_tail(self._segment_path(self.segment_id))
+        self._open_segment()
+
+    def segments(self) -> List[int]:
+        """Ids of the segment files on disk, in ascending order."""
+        return sorted(
+            int(match.group(1))
+            for match in (_SEGMENT_PATTERN.match(name) for name in os.listdir(self.path))
+            if match
+        )
+
+    def append_upsert(self, key: str, vector: np.ndarray, metadata: Optional[Dict] = None) -> None:
+        self._write([_encode(UPSERT, key, vector, metadata)])
+
+    def append_upserts(
+        self,
+        keys: Sequence[str],
+        vectors: np.ndarray,
+        metadata_list: Optional[Sequence[Optional[Dict]]] = None,
+    ) -> None:
+        """Append a batch of upserts with a single write."""
+        metadata_list = metadata_list or [None] * len(keys)
+        self._write(
+            [_encode(UPSERT, key, vector, metadata) for key, vector, metadata in zip(keys, vectors, metadata_list)]
+        )
+
+    def append_delete(self, key: str) -> None:
+        self._write([_encode(DELETE, key, None, None)])
+
+    def roll(self) -> int:
+        """Close the current segment and start a new one; returns the new segment id."""
+        self._file.close()
+        self.segment_id += 1
+        self._open_segment()
+        return self.segment_id
+
+    def replay(self, start_segment: int = 1) -> Iterator[Tuple[int, str, Optional[np.ndarray], Optional[Dict]]]:
+        """
+        Yield (op, key, vector, metadata) for every record in segments >= `start_segment`.
+
+        Replay of a segment stops at the first truncated or corrupt record.
+        """
+        self._file.flush()
+        for segment_id in self.segments():
+            if segment_id < start_segment:
+                continue
+            with open(self._segment_path(segment_id), "rb") as f:
+                data = f.read()
+            for _, record in _decode(data):
+                yield record
+
+    def remove_segments_before(self, segment_id: int) -> None:
+        """Delete segments whose contents are covered by a snapshot."""
+        for existing in self.segments():
+            if existing < segment_id:
+                os.remove(self._segment_path(existing))
+        if self.fsync:
+            fsync_directory(self.path)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _open_segment(self) -> None:
+        self._file = open(self._segment_path(self.segment_id), "ab")
+        if self.fsync:
+            fsync_directory(self.path)
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.path, f"wal-{segment_id:06d}.log")
+
+    def _truncate_torn_tail(self, segment_path: str) -> None:
+        # Appending after a torn record would hide every later record from replay
+        if not os.path.exists(segment_path):
+            return
+        with open(segment_path, "rb") as f:
+            data = f.read()
+        valid_length = 0
+        for valid_length, _ in _decode(data):
+            pass
+        if valid_length < len(data):
+            with open(segment_path, "r+b") as f:
+                f.truncate(valid_length)
+
+    def _write(self, records: List[bytes]) -> None:
+        self._file.write(b"".join(records))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+
+def _decode(data: bytes) -> Iterator[Tuple[int, Tuple[int, str, Optional[np.ndarray], Optional[Dict]]]]:
+    """Yield (end offset, record) for each intact record, stopping at the first bad one."""
+    offset = 0
+    while offset + _HEADER.size <= len(data):
+        op, key_length, metadata_length, vector_length, checksum = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        end = start + key_length + metadata_length + 4 * vector_length
+        payload = data[start:end]
+        if end > len(data) or zlib.crc32(payload) != checksum:
+            return
+        key = payload[:key_length].decode("utf-8")
+        metadata_bytes = payload[key_length : key_length + metadata_length]
+        metadata = json.loads(metadata_bytes) if metadata_bytes else None
+        vector = (
+            np.frombuffer(payload[key_length + metadata_length :], dtype=np.float32)
+            if vector_length
+            else None
+        )
+        yield end, (op, key, vector, metadata)
+        offset = end
+
+
+def _encode(op: int, key: str, vector: Optional[np.ndarray], metadata: Optional[Dict]) -> bytes:
+    key_bytes = key.encode("utf-8")
+    metadata_bytes = json.dumps(metadata, separators=(",", ":")).encode("utf-8") if metadata else b""
+    vector_bytes = b"" if vector is None else np.asarray(vector, dtype=np.float32).tobytes()
+    payload = key_bytes + metadata_bytes + vector_bytes
+    return _HEADER.pack(op, len(key_bytes), len(metadata_bytes), len(vector_bytes) // 4, zlib.crc32(payload)) + payload
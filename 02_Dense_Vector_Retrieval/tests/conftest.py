@@ -0,0 +1,36 @@
+import hashlib
+import numpy as np
+import pytest
+from typing import List
+
+
+class FakeEmbeddingModel:
+    """Deterministic stand-in for EmbeddingModel: each text maps to a seeded random vector."""
+
+    embeddings_model_name = "fake"
+
+    def __init__(self, dim: int = 32):
+        self.dim = dim
+
+    def get_embedding(self, text: str) -> List[float]:
+        seed = int(hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest(), 16)
+        return np.random.default_rng(seed).standard_normal(self.dim).tolist()
+
+    def get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
+        return [self.get_embedding(text) for text in list_of_text]
+
+    async def async_get_embedding(self, text: str) -> List[float]:
+        return self.get_embedding(text)
+
+    async def async_get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
+        return self.get_embeddings(list_of_text)
+
+
+@pytest.fixture(scope="session")
+def embedding_model() -> FakeEmbeddingModel:
+    return FakeEmbeddingModel()
+
+
+@pytest.fixture
+def vectors() -> np.ndarray:
+    return np.random.default_rng(0).standard_normal((400, 32)).astype(np.float32)
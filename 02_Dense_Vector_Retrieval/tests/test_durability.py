@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import numpy as np
+
+from aimakerspace.vectordatabase import VectorDatabase
+from aimakerspace.wal import UPSERT, WriteAheadLog
+
+
+def test_open_replays_log_without_snapshot(tmp_path, embedding_model, vectors):
+    db = VectorDatabase.open(str(tmp_path), embedding_model)
+    for i in range(20):
+        db.insert(f"k{i}", vectors[i])
+    db.delete("k3")
+    db.insert("k5", vectors[100])
+    db.close()
+
+    reopened = VectorDatabase.open(str(tmp_path), embedding_model)
+    assert sorted(reopened.storage.live_keys) == sorted(f"k{i}" for i in range(20) if i != 3)
+    np.testing.assert_allclose(reopened.retrieve_from_key("k5"), vectors[100], rtol=1e-5)
+    assert reopened.search(vectors[7], 1)[0][0] == "k7"
+    reopened.close()
+
+
+def test_open_replays_log_on_top_of_snapshot(tmp_path, embedding_model, vectors):
+    db = VectorDatabase.open(str(tmp_path), embedding_model, fsync=True)
+    for i in range(10):
+        db.insert(f"a{i}", vectors[i])
+    db.compact()
+    for i in range(10):
+        db.insert(f"b{i}", vectors[10 + i])
+    db.delete("a0")
+    db.close()
+
+    current = json.loads((tmp_path / "CURRENT").read_text())
+    assert current["snapshot"] and os.path.isdir(tmp_path / current["snapshot"])
+    reopened = VectorDatabase.open(str(tmp_path), embedding_model)
+    assert len(reopened.storage.live_keys) == 19 and "a0" not in reopened.storage
+    reopened.close()
+
+
+def test_torn_tail_is_truncated_before_appending(tmp_path, embedding_model, vectors):
+    db = VectorDatabase.open(str(tmp_path), embedding_model)
+    for i in range(5):
+        db.insert(f"k{i}", vectors[i])
+    db.close()
+
+    segment = tmp_path / "wal" / "wal-000001.log"
+    intact = segment.stat().st_size
+    with open(segment, "r+b") as f:
+        f.truncate(intact - 7)  # tear the last record
+
+    db = VectorDatabase.open(str(tmp_path), embedding_model)
+    assert sorted(db.storage.live_keys) == [f"k{i}" for i in range(4)]
+    db.insert("after", vectors[50])
+    db.close()
+
+    # The new record must be readable, i.e. not hidden behind the torn bytes
+    wal = WriteAheadLog(str(tmp_path / "wal"))
+    keys = [key for op, key, _, _ in wal.replay() if op == UPSERT]
+    wal.close()
+    assert keys == ["k0", "k1", "k2", "k3", "after"]
+
+
+def test_corrupt_record_stops_replay(tmp_path, vectors):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.append_upserts(["a", "b", "c"], vectors[:3])
+    wal.close()
+
+    segment = tmp_path / "wal-000001.log"
+    data = bytearray(segment.read_bytes())
+    data[-1] ^= 0xFF  # flip a bit in the last vector, breaking its CRC
+    segment.write_bytes(bytes(data))
+
+    wal = WriteAheadLog(str(tmp_path))
+    assert [key for _, key, _, _ in wal.replay()] == ["a", "b"]
+    wal.close()
+
+
+class DeferredThread(threading.Thread):
+    """Thread whose start() is a no-op, so the test decides when (and in which order) it runs."""
+
+    def start(self):
+        pass
+
+
+def test_out_of_order_background_compaction(tmp_path, embedding_model, vectors, monkeypatch):
+    monkeypatch.setattr(threading, "Thread", DeferredThread)
+    db = VectorDatabase.open(str(tmp_path), embedding_model)
+    for i in range(10):
+        db.insert(f"a{i}", vectors[i])
+    older = db.compact(background=True)
+    for i in range(10):
+        db.insert(f"b{i}", vectors[10 + i])
+    newer = db.compact(background=True)
+    for i in range(3):
+        db.insert(f"c{i}", vectors[20 + i])
+
+    newer.run()
+    current = json.loads((tmp_path / "CURRENT").read_text())
+    # The older compaction finishing last must not roll CURRENT back
+    older.run()
+    assert json.loads((tmp_path / "CURRENT").read_text()) == current
+    snapshots = sorted(name for name in os.listdir(tmp_path) if name.startswith("snapshot-"))
+    assert snapshots == [current["snapshot"]]
+    assert db.wal.segments() == [current["wal_start"]]
+
+    # A compaction still running when the database is closed completes on its own
+    late = db.compact(background=True)
+    db.close()
+    late.run()
+
+    reopened = VectorDatabase.open(str(tmp_path), embedding_model)
+    assert len(reopened.storage.live_keys) == 23
+    assert json.loads((tmp_path / "CURRENT").read_text())["wal_start"] > current["wal_start"]
+    reopened.close()
+
+
+def test_open_forwards_storage_options(tmp_path, embedding_model, vectors):
+    path = str(tmp_path / "db")
+    db = VectorDatabase.open(path, embedding_model, dtype="int8", vacuum_threshold=None)
+    for i in range(30):
+        db.insert(f"k{i}", vectors[i])
+    db.compact()
+    db.close()
+
+    reopened = VectorDatabase.open(path, embedding_model, vectors_path=str(tmp_path / "vectors.bin"))
+    assert reopened.storage.dtype == "int8"
+    assert reopened.search(vectors[4], 1)[0][0] == "k4"
+    reopened.close()
@@ -0,0 +1,72 @@
+import random
+import numpy as np
+import pytest
+
+from aimakerspace.vectordatabase_enhanced import VectorDatabaseWithMetadata
+
+MISSING = object()
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# (filter, equivalent predicate over a metadata dict)
+CASES = [
+    ({"year": 2000}, lambda m: m.get("year") == 2000),
+    ({"topic": None}, lambda m: m.get("topic") is None),
+    ({"topic": "a", "year": 2024}, lambda m: m.get("topic") == "a" and m.get("year") == 2024),
+    ({"d": {"n": 1}}, lambda m: m.get("d") == {"n": 1}),
+    ({"d": [1, 2]}, lambda m: m.get("d") == [1, 2]),
+    ({"year": {"$gte": 2000, "$lt": 2024}}, lambda m: is_number(m.get("year")) and 2000 <= m["year"] < 2024),
+    ({"year": {"$gt": "2000"}}, lambda m: isinstance(m.get("year"), str) and m["year"] > "2000"),
+    ({"topic": {"$in": ["a", "b"]}}, lambda m: m.get("topic") in ("a", "b")),
+    ({"topic": {"$nin": ["a", None]}}, lambda m: m.get("topic") not in ("a", None)),
+    ({"topic": {"$ne": "c"}}, lambda m: m.get("topic", MISSING) != "c"),
+    ({"year": {"$exists": False}}, lambda m: "year" not in m),
+    (
+        {"$or": [{"topic": "a"}, {"year": {"$lte": 1999}}]},
+        lambda m: m.get("topic") == "a" or (is_number(m.get("year")) and m["year"] <= 1999),
+    ),
+    ({"$not": {"topic": "b"}, "d": {"$exists": True}}, lambda m: m.get("topic") != "b" and "d" in m),
+]
+
+
+@pytest.fixture(scope="module")
+def corpus(embedding_model):
+    """A database with mixed-type metadata, after deletes and automatic vacuums, and its metadata by key."""
+    rng = random.Random(0)
+    vectors = np.random.default_rng(1).standard_normal((3000, 32))
+    db = VectorDatabaseWithMetadata(embedding_model=embedding_model, vacuum_threshold=0.2)
+    docs = {}
+    for i in range(3000):
+        metadata = {}
+        if rng.random() < 0.8:
+            metadata["year"] = rng.choice([1999, 2000, 2000.0, 2020, 2024, "2021"])
+        if rng.random() < 0.7:
+            metadata["topic"] = rng.choice(["a", "b", "c", None])
+        if rng.random() < 0.3:
+            metadata["d"] = rng.choice([{"n": 1}, {"n": 2}, [1, 2]])
+        db.insert(f"k{i}", vectors[i], metadata)
+        docs[f"k{i}"] = metadata
+    for i in range(0, 3000, 3):
+        db.delete(f"k{i}")
+        del docs[f"k{i}"]
+    return db, docs
+
+
+@pytest.mark.parametrize("spec, predicate", CASES)
+def test_filter_matches_brute_force(corpus, spec, predicate):
+    db, docs = corpus
+    expected = sorted(key for key, metadata in docs.items() if predicate(metadata))
+    assert sorted(db.filter_by_metadata(spec)) == expected
+
+
+@pytest.mark.parametrize("spec, predicate", CASES)
+def test_filtered_search_only_returns_matches(corpus, spec, predicate):
+    db, docs = corpus
+    expected = {key for key, metadata in docs.items() if predicate(metadata)}
+    query = np.random.default_rng(2).standard_normal(32)
+    results = db.search(query, 5, filter_metadata=spec)
+    assert len(results) == min(5, len(expected))
+    assert all(key in expected for key, _, _ in results)
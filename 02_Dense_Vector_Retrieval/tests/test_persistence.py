@@ -0,0 +1,41 @@
+import os
+import numpy as np
+import pytest
+
+from aimakerspace.indexes.hnsw import HNSWIndex
+from aimakerspace.indexes.ivf import IVFIndex
+from aimakerspace.vectordatabase import VectorDatabase
+from aimakerspace.vectordatabase_enhanced import VectorDatabaseWithMetadata
+
+
+@pytest.mark.parametrize("database", [VectorDatabase, VectorDatabaseWithMetadata])
+def test_saved_ivf_index_is_reused_on_load(database, tmp_path, embedding_model, vectors, monkeypatch):
+    db = database(
+        embedding_model=embedding_model,
+        index=IVFIndex(min_train_size=64, retrain_growth=None, seed=7, nprobe=4),
+        vacuum_threshold=None,
+    )
+    for i, vector in enumerate(vectors):
+        db.insert(f"k{i}", vector)
+    for i in range(0, len(vectors), 10):
+        db.delete(f"k{i}")
+    db.save(str(tmp_path))
+
+    index = IVFIndex.load(os.path.join(tmp_path, "index.npz"))
+    assert (index.retrain_growth, index.seed, index.nprobe) == (None, 7, 4)
+    assert len(index) == 360
+    monkeypatch.setattr(index, "add", lambda *args: pytest.fail("load() re-added covered rows"))
+    loaded = database.load(str(tmp_path), embedding_model=embedding_model, index=index)
+    assert loaded.search(vectors[5], 1)[0][0] == "k5"
+
+
+def test_load_builds_a_new_index_over_every_row(tmp_path, embedding_model, vectors):
+    db = VectorDatabase(embedding_model=embedding_model)
+    for i in range(100):
+        db.insert(f"k{i}", vectors[i])
+    db.save(str(tmp_path))
+
+    index = HNSWIndex(seed=0)
+    loaded = VectorDatabase.load(str(tmp_path), embedding_model=embedding_model, index=index, dtype="float16")
+    assert len(index) == 100 and loaded.storage.dtype == "float16"
+    assert loaded.search(vectors[42], 1)[0][0] == "k42"
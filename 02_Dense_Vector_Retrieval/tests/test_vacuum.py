@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from aimakerspace.indexes.hnsw import HNSWIndex
+from aimakerspace.indexes.ivf import IVFIndex
+from aimakerspace.indexes.pq import PQIndex
+from aimakerspace.vectordatabase import VectorDatabase
+from aimakerspace.vectordatabase_enhanced import VectorDatabaseWithMetadata
+
+INDEXES = {
+    "hnsw": lambda: HNSWIndex(M=8, ef_construction=64, seed=0),
+    "ivf": lambda: IVFIndex(min_train_size=64, nprobe=64, seed=0),
+    "pq": lambda: PQIndex(n_subvectors=8, n_bits=6, min_train_size=64, rerank_k=400, seed=0),
+}
+
+
+def exact_top(vectors: np.ndarray, keys: list, query: np.ndarray, k: int) -> list:
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    order = np.argsort(-(unit @ (query / np.linalg.norm(query))), kind="stable")[:k]
+    return [keys[i] for i in order]
+
+
+@pytest.mark.parametrize("database", [VectorDatabase, VectorDatabaseWithMetadata])
+@pytest.mark.parametrize("index_name", sorted(INDEXES))
+def test_vacuum_remaps_index(database, index_name, embedding_model, vectors, monkeypatch):
+    index = INDEXES[index_name]()
+    db = database(embedding_model=embedding_model, index=index, vacuum_threshold=None)
+    for i, vector in enumerate(vectors):
+        db.insert(f"k{i}", vector)
+    for i in range(0, len(vectors), 3):
+        db.delete(f"k{i}")
+
+    # remap() must carry the index over without a rebuild
+    monkeypatch.setattr(index, "reset", lambda: pytest.fail("vacuum() rebuilt the index"))
+    db.vacuum()
+    assert db.storage.dead_fraction == 0
+    assert len(db.storage) == len(vectors) - len(range(0, len(vectors), 3))
+
+    live = [i for i in range(len(vectors)) if i % 3]
+    keys = [f"k{i}" for i in live]
+    for query in vectors[[1, 2, 50, 200]]:
+        results = [result[0] for result in db.search(query, 5)]
+        assert results == exact_top(vectors[live], keys, query, 5)
+
+
+@pytest.mark.parametrize("index_name", sorted(INDEXES))
+def test_inserts_after_vacuum_are_indexed(index_name, embedding_model, vectors):
+    db = VectorDatabase(embedding_model=embedding_model, index=INDEXES[index_name](), vacuum_threshold=0.2)
+    for i in range(300):
+        db.insert(f"k{i}", vectors[i])
+    for i in range(100):
+        db.delete(f"k{i}")  # crosses the threshold and vacuums automatically
+    assert db.storage.dead_fraction < 0.2
+    for i in range(300, 400):
+        db.insert(f"k{i}", vectors[i])
+
+    assert db.search(vectors[350], 1)[0][0] == "k350"
+    assert all(int(key[1:]) >= 100 for key, _ in db.search(vectors[5], 10))
+
+
+def test_sharded_search_refreshes_after_delete_and_vacuum(embedding_model, vectors):
+    db = VectorDatabase(embedding_model=embedding_model, vacuum_threshold=None)
+    db.storage.add_batch([f"k{i}" for i in range(len(vectors))], vectors)
+    db.start_sharded_search(n_workers=2, n_shards=3)
+    try:
+        queries = vectors[[3, 40, 41, 300]]
+        assert db.search(vectors[40], 1)[0][0] == "k40"
+
+        db.delete("k40")
+        db.insert("new", -vectors[41])
+        assert db.search(vectors[40], 1)[0][0] != "k40"
+        assert db.search(-vectors[41], 1)[0][0] == "new"
+
+        for i in range(0, 200, 2):
+            db.delete(f"k{i}")
+        db.vacuum()  # renumbers every row, so the whole matrix is republished
+        sharded = db.search_many(queries, 5)
+        db.stop_sharded_search()
+        exact = db.search_many(queries, 5)
+        assert [[key for key, _ in row] for row in sharded] == [[key for key, _ in row] for row in exact]
+        np.testing.assert_allclose(
+            [[score for _, score in row] for row in sharded], [[score for _, score in row] for row in exact], rtol=1e-5
+        )
+    finally:
+        db.close()